@@ -0,0 +1,4 @@
+"""Offline benchmarks for playback, resolution, queue operations and embeds.
+
+Run from the app directory with ``python -m benchmarks``.
+"""
@@ -0,0 +1,4 @@
+import sys
+from benchmarks.run import run
+
+run(sys.argv[1:])
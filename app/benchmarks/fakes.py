@@ -0,0 +1,231 @@
+import os
+import time
+import shutil
+import hashlib
+import threading
+import subprocess
+import discord
+from aiohttp import web
+
+FRAME_SECONDS = discord.opus.Encoder.FRAME_LENGTH / 1000
+SILENCE = b'\x00' * discord.opus.Encoder.FRAME_SIZE
+
+
+def make_video_id(query):
+    """Get a stable, YouTube shaped id for a query."""
+    return hashlib.sha256(query.encode()).hexdigest()[:11]
+
+
+class StubExtractor:
+    """Stands in for yt-dlp and returns canned info dicts for any query."""
+    def __init__(self, server, duration, codec='opus', delay=0.0):
+        self.server = server
+        self.duration = duration
+        self.codec = codec
+        self.delay = delay
+        self.calls = 0
+
+    def __call__(self, options, query):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        video_id = make_video_id(query)
+        expire = int(time.time()) + 6 * 3600
+        return {
+            'id': video_id,
+            'title': f"Benchmark {query}",
+            'duration': self.duration,
+            'webpage_url': f"https://www.youtube.com/watch?v={video_id}",
+            'url': f"{self.server.url}/audio/{self.codec}?expire={expire}",
+            'acodec': self.codec,
+            'thumbnail': f"{self.server.url}/thumbnail.png",
+            'uploader': 'Benchmark',
+            'view_count': 0,
+            'like_count': 0,
+        }
+
+
+class AudioServer:
+    """Local HTTP server for the test audio files and an empty SponsorBlock API."""
+    CODECS = {
+        'opus': ('track.webm', ['-c:a', 'libopus', '-b:a', '128k']),
+        'mp3': ('track.mp3', ['-c:a', 'libmp3lame', '-b:a', '192k']),
+    }
+
+    def __init__(self, directory, duration):
+        self.directory = directory
+        self.duration = duration
+        self.files = {}
+        self.url = None
+        self._runner = None
+
+    def generate(self):
+        """Render a sine tone in each codec with FFmpeg."""
+        if not shutil.which('ffmpeg'):
+            return False
+        for codec, (name, args) in self.CODECS.items():
+            path = os.path.join(self.directory, name)
+            subprocess.run(
+                ['ffmpeg', '-y', '-loglevel', 'error', '-f', 'lavfi',
+                 '-i', f'sine=frequency=440:duration={self.duration}', '-ac', '2', '-ar', '48000',
+                 *args, path],
+                check=True
+            )
+            self.files[codec] = path
+        return True
+
+    async def _audio(self, request):
+        path = self.files.get(request.match_info['codec'])
+        if not path:
+            raise web.HTTPNotFound()
+        return web.FileResponse(path)
+
+    async def _segments(self, request):
+        raise web.HTTPNotFound()
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/audio/{codec}', self._audio)
+        app.router.add_get('/api/skipSegments/{prefix}', self._segments)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+
+    async def close(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+
+class FakeVoiceClient:
+    """Consumes frames like discord's AudioPlayer without a voice connection.
+
+    Encodes PCM frames with libopus when it is available, like the real
+    player, and measures the thread CPU spent per frame. Frames of silence
+    fed by the engine while it waits on a late track are counted apart.
+    """
+    def __init__(self, loop, realtime=False):
+        self.loop = loop
+        self.realtime = realtime
+        self.source = None
+        self.frames = 0
+        self.opus_frames = 0
+        self.silent_frames = 0
+        self.cpu_seconds = 0.0
+        self.wall_seconds = 0.0
+        self._thread = None
+        self._end = threading.Event()
+        self._resumed = threading.Event()
+        self._resumed.set()
+        try:
+            self._encoder = discord.opus.Encoder()
+        except discord.opus.OpusNotLoaded:
+            self._encoder = None
+
+    def play(self, source, *, after=None):
+        if self.is_playing():
+            raise discord.ClientException('Already playing audio.')
+        self.source = source
+        self._end.clear()
+        self._thread = threading.Thread(target=self._run, args=(source, after), daemon=True)
+        self._thread.start()
+
+    def _run(self, source, after):
+        started = time.perf_counter()
+        cpu_started = time.thread_time()
+        error = None
+        try:
+            while not self._end.is_set():
+                self._resumed.wait()
+                data = source.read()
+                if not data:
+                    break
+                if data == SILENCE:
+                    self.silent_frames += 1
+                if source.is_opus():
+                    self.opus_frames += 1
+                elif self._encoder:
+                    self._encoder.encode(data, self._encoder.SAMPLES_PER_FRAME)
+                self.frames += 1
+                if self.realtime:
+                    time.sleep(max(0, started + self.frames * FRAME_SECONDS - time.perf_counter()))
+        except Exception as e:
+            error = e
+        finally:
+            self.cpu_seconds += time.thread_time() - cpu_started
+            self.wall_seconds += time.perf_counter() - started
+            self._end.set()
+            if after:
+                after(error)
+            source.cleanup()
+
+    def is_playing(self):
+        return self._thread is not None and self._thread.is_alive() and not self._end.is_set()
+
+    def is_paused(self):
+        return not self._resumed.is_set()
+
+    def is_connected(self):
+        return True
+
+    def pause(self):
+        self._resumed.clear()
+
+    def resume(self):
+        self._resumed.set()
+
+    def stop(self):
+        self._end.set()
+        self._resumed.set()
+
+    async def disconnect(self):
+        self.stop()
+
+
+class FakeMember:
+    def __init__(self, member_id):
+        self.id = member_id
+        self.name = f"user{member_id}"
+        self.display_name = self.name
+        self.mention = f"<@{member_id}>"
+
+    def __str__(self):
+        return self.name
+
+
+class FakeMessage:
+    async def edit(self, **kwargs):
+        pass
+
+    async def delete(self):
+        pass
+
+
+class FakeGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+
+
+class FakeContext:
+    """The parts of commands.Context the player and views use."""
+    def __init__(self, guild_id, voice_client, author):
+        self.guild = FakeGuild(guild_id)
+        self.voice_client = voice_client
+        self.author = author
+        self.sent = 0
+
+    async def send(self, *args, **kwargs):
+        self.sent += 1
+        return FakeMessage()
+
+
+class FakeBot:
+    """The parts of MusicBot the player and views use."""
+    def __init__(self, loop):
+        from views.refresh_scheduler import RefreshScheduler
+
+        self.loop = loop
+        self.music_queues = {}
+        self.refresh_scheduler = RefreshScheduler(self)
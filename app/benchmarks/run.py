@@ -0,0 +1,223 @@
+import os
+import sys
+import time
+import random
+import asyncio
+import logging
+import argparse
+import resource
+import tempfile
+import statistics
+
+# Keep every cache and lookup local before the bot modules read their config
+WORKDIR = tempfile.mkdtemp(prefix='tunebot-bench-')
+os.environ['EXTRACTION_CACHE_PATH'] = os.path.join(WORKDIR, 'extraction.db')
+os.environ['MATCH_INDEX_PATH'] = os.path.join(WORKDIR, 'matches.db')
+os.environ['LOUDNESS_CACHE_PATH'] = os.path.join(WORKDIR, 'loudness.db')
+os.environ['AUDIO_CACHE_DIR'] = os.path.join(WORKDIR, 'audio')
+os.environ['QUEUE_STORE_PATH'] = os.path.join(WORKDIR, 'queues.db')
+os.environ['AUDIO_CACHE'] = '0'
+os.environ['EXTRACTION_PROCESSES'] = '0'
+
+from benchmarks.fakes import (
+    AudioServer, StubExtractor, FakeVoiceClient, FakeContext, FakeBot, FakeMember
+)
+import utils.sponsorblock as sponsorblock
+import utils.extraction_scheduler as extraction_scheduler
+from models.music_queue import MusicQueue
+from models.music_player import MusicPlayer, PlayerState
+from models.yt_source import YTDLSource
+
+logging.basicConfig(level=logging.ERROR)
+
+GUILD_ID = 1
+QUEUE_SIZES = (10, 1_000, 100_000)
+
+
+def summarize(values):
+    """Format min/avg/max of a list of milliseconds."""
+    if not values:
+        return 'n/a'
+    return f"min {min(values):.2f} / avg {statistics.mean(values):.2f} / max {max(values):.2f} ms"
+
+
+def timed(func, repeat):
+    """Get the average time of a call in microseconds."""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+async def bench_resolve(count):
+    """Time create_source on a cold and a warm extraction cache."""
+    cold, warm = [], []
+    for i in range(count):
+        query = f"resolve {i} {random.random()}"
+        started = time.perf_counter()
+        await YTDLSource.create_source(query)
+        cold.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await YTDLSource.create_source(query)
+        warm.append((time.perf_counter() - started) * 1000)
+
+    print(f"  cold (stub extractor): {summarize(cold)}")
+    print(f"  warm (cache hit):      {summarize(warm)}")
+
+
+async def bench_playback(loop, codec, tracks, realtime, extractor):
+    """Play tracks back to back through the player and a fake voice client."""
+    extractor.codec = codec
+    bot = FakeBot(loop)
+    queue = bot.music_queues[GUILD_ID] = MusicQueue()
+    player = MusicPlayer(bot, GUILD_ID)
+    voice_client = FakeVoiceClient(loop, realtime=realtime)
+    ctx = FakeContext(GUILD_ID, voice_client, FakeMember(1))
+
+    sources = []
+    for i in range(tracks):
+        source = await YTDLSource.create_source(f"{codec} track {i}")
+        source.requester = ctx.author
+        sources.append(source)
+    queue.extend(sources[1:])
+
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    started = time.perf_counter()
+    await player.play_song(ctx, sources[0])
+    while player.state is not PlayerState.IDLE or voice_client.is_playing():
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - started
+    children_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    ffmpeg_cpu = (children_after.ru_utime + children_after.ru_stime) - (children.ru_utime + children.ru_stime)
+
+    bot.refresh_scheduler.close()
+    player.shutdown()
+
+    mode = 'passthrough' if voice_client.opus_frames else 'pcm'
+    print(f"  {codec} ({mode}, {'realtime' if realtime else 'unthrottled'}):")
+    print(f"    frames: {voice_client.frames} in {elapsed:.2f} s ({voice_client.frames / elapsed:.0f} frames/s), "
+          f"{voice_client.silent_frames} of them silence")
+    if not voice_client._encoder:
+        print("    (libopus not found, PCM frames were not encoded)")
+    print(f"    inter-track gap: {summarize(list(player.transition_gaps))}")
+    if voice_client.wall_seconds:
+        print(f"    voice thread CPU: {voice_client.cpu_seconds / voice_client.wall_seconds * 100:.2f}% of a core")
+    print(f"    ffmpeg CPU: {ffmpeg_cpu / elapsed * 100:.2f}% of a core")
+
+
+def bench_queue(size):
+    """Time MusicQueue operations on a queue of a given size."""
+    members = [FakeMember(i) for i in range(50)]
+    entries = [
+        {'title': f"Track {i}", 'artist': 'Bench', 'duration': 180 + i % 60, 'requester': members[i % 50]}
+        for i in range(size)
+    ]
+    queue = MusicQueue()
+    started = time.perf_counter()
+    queue.extend(entries)
+    results = {'extend (per entry)': (time.perf_counter() - started) / size * 1e6}
+
+    repeat = max(10, min(1000, 100_000 // size))
+    middle = size // 2
+
+    def pop_insert_middle():
+        queue.appendleft(queue.pop_at(middle))
+
+    def remove_middle():
+        entry = queue.queue[middle]
+        queue.remove(entry)
+        queue.append(entry)
+
+    results['append + pop_left'] = timed(lambda: queue.append(queue.pop_left()), repeat)
+    results['pop_at(middle) + appendleft'] = timed(pop_insert_middle, repeat)
+    results['remove(entry)'] = timed(remove_middle, repeat)
+    results['page slice (middle)'] = timed(lambda: queue.queue[middle:middle + 20], repeat)
+    results['requester_stats'] = timed(queue.requester_stats, repeat)
+    results['shuffle'] = timed(queue.shuffle, max(1, repeat // 10))
+
+    def remove_requester():
+        removed = [entry for entry in queue.queue if entry['requester'] is members[0]]
+        queue.remove_requester(members[0])
+        queue.extend(removed)
+
+    results['remove_requester + re-add'] = timed(remove_requester, max(1, repeat // 10))
+    return results
+
+
+async def bench_embeds(loop, size):
+    """Time the now playing and queue embed builders."""
+    from views.now_playing_view import NowPlayingView
+    from views.queue_view import QueueView
+
+    bot = FakeBot(loop)
+    queue = bot.music_queues[GUILD_ID] = MusicQueue()
+    members = [FakeMember(i) for i in range(50)]
+    queue.extend(
+        {'title': f"Track {i}", 'artist': 'Bench', 'duration': 200, 'requester': members[i % 50]}
+        for i in range(size)
+    )
+    player = MusicPlayer(bot, GUILD_ID)
+    ctx = FakeContext(GUILD_ID, FakeVoiceClient(loop), members[0])
+    track = {'title': 'Now', 'duration': 200, 'url': '', 'thumbnail': '', 'requester': members[0], 'position': 0}
+
+    now_playing = NowPlayingView(ctx, bot, track, player)
+    queue_view = QueueView(ctx, bot)
+    queue_view.page = (size // queue_view.items_per_page) // 2
+    repeat = 200
+    print(f"  {size} queued: now playing {timed(now_playing.get_embed, repeat):.1f} us, "
+          f"queue page {timed(queue_view.get_embed, repeat):.1f} us")
+    bot.refresh_scheduler.close()
+
+
+async def main(args):
+    loop = asyncio.get_running_loop()
+    server = AudioServer(WORKDIR, args.duration)
+    have_audio = server.generate()
+    await server.start()
+    sponsorblock.SPONSORBLOCK_API = server.url
+
+    extractor = StubExtractor(server, args.duration, delay=args.extract_ms / 1000)
+    extraction_scheduler.run_extraction = extractor
+
+    print(f"Resolve latency ({args.tracks} tracks, {args.extract_ms} ms simulated extraction):")
+    await bench_resolve(args.tracks)
+
+    print("Playback:")
+    if have_audio:
+        for codec in ('opus', 'mp3'):
+            await bench_playback(loop, codec, args.tracks, args.realtime, extractor)
+    else:
+        print("  skipped, ffmpeg is not installed")
+
+    print("Queue operations (us per op):")
+    for size in args.sizes:
+        results = bench_queue(size)
+        print(f"  {size} entries:")
+        for name, value in results.items():
+            print(f"    {name:<28} {value:10.2f}")
+
+    print("Embed builders:")
+    for size in args.sizes:
+        await bench_embeds(loop, size)
+
+    await sponsorblock.sponsorblock_handler.close()
+    await server.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Offline playback and queue benchmarks')
+    parser.add_argument('--tracks', type=int, default=3, help='tracks per playback run')
+    parser.add_argument('--duration', type=int, default=4, help='seconds of audio per track')
+    parser.add_argument('--extract-ms', type=int, default=50, help='simulated yt-dlp latency')
+    parser.add_argument('--realtime', action='store_true', help='consume frames at 50 per second like Discord')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(QUEUE_SIZES), help='queue sizes to time')
+    return parser.parse_args(argv)
+
+
+def run(argv=None):
+    asyncio.run(main(parse_args(argv)))
+
+
+if __name__ == '__main__':
+    run(sys.argv[1:])
@@ -1,23 +1,37 @@
 import discord
 from discord.ext import commands
-import random
 import logging
-from models.music_queue import MusicQueue
+from models.music_queue import LoopMode, MusicQueue
 from models.yt_source import YTDLSource
-from models.music_player import MusicPlayer
+from models.queue_store import queue_store
+from models.audio_filters import EQ_PRESETS, MAX_VOLUME
+from utils.extraction_scheduler import PRIORITY_NOW_PLAYING, PRIORITY_PREFETCH
 from views.queue_view import QueueView
-from utils.format import format_duration
+from utils.format import format_duration, parse_duration
+from utils.metrics import metrics
+from utils.extraction_cache import extraction_cache
+from utils.match_index import match_index
+from utils.sponsorblock import sponsorblock_handler
 import asyncio
-from collections import deque
 
-logging.basicConfig(level=logging.ERROR)
+# Hot paths shown by the stats command, as (metric, label)
+STATS_TIMINGS = (
+    ('event_loop_lag_seconds', 'Event loop lag'),
+    ('voice_frame_jitter_seconds', 'Frame jitter'),
+    ('track_transition_gap_seconds', 'Track gap'),
+    ('track_resolve_seconds', 'Track resolve'),
+    ('extraction_seconds', 'yt-dlp extraction'),
+    ('spotify_request_seconds', 'Spotify API'),
+    ('sponsorblock_request_seconds', 'SponsorBlock API'),
+    ('ffmpeg_spawn_seconds', 'FFmpeg spawn'),
+    ('embed_edit_seconds', 'Embed edit'),
+)
 
 class Music(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.active_queue_messages = {}
         self.invalid_command_counts = {}
-        self.player = MusicPlayer(bot)
         
         # Define commands with their aliases
         self.command_list = {
@@ -28,6 +42,12 @@ class Music(commands.Cog):
             'resume': [],
             'skip': ['s'],
             'nowplaying': ['np'],
+            'seek': [],
+            'ff': ['forward'],
+            'rewind': ['rw'],
+            'volume': ['vol', 'v'],
+            'eq': [],
+            'normalize': ['norm'],
             # Queue controls
             'queue': ['q'],
             'shuffle': ['sh'],
@@ -37,6 +57,7 @@ class Music(commands.Cog):
             'remove': ['rm'],
             # System controls
             'disconnect': ['dc'],
+            'stats': [],
             'help': ['h'],
         }
         
@@ -71,17 +92,40 @@ class Music(commands.Cog):
     async def get_queue(self, ctx):
         """Get the guild's music queue."""
         if ctx.guild.id not in self.bot.music_queues:
-            self.bot.music_queues[ctx.guild.id] = MusicQueue()
+            # First activity since startup, pick up where the last run left off
+            queue = MusicQueue()
+            restored = await queue_store.restore(ctx.guild, queue)
+            if ctx.guild.id in self.bot.music_queues:
+                # Another command got here while the saved queue was loading
+                return self.bot.music_queues[ctx.guild.id]
+            self.bot.music_queues[ctx.guild.id] = queue
+            if restored:
+                await ctx.send(f"♻️ Restored {restored} tracks from before the restart, use `{ctx.prefix}play` to resume")
         return self.bot.music_queues[ctx.guild.id]
 
+    def get_player(self, ctx):
+        """Get the guild's music player."""
+        return self.bot.players.get(ctx.guild.id)
+
+    def get_priority(self, ctx):
+        """Get the extraction priority for a track requested by a command."""
+        if ctx.voice_client and ctx.voice_client.is_playing():
+            # Only being queued, don't hold up the track that plays next
+            return PRIORITY_PREFETCH
+        return PRIORITY_NOW_PLAYING
+
     async def process_spotify_url(self, ctx, url):
         """Process Spotify URLs and add tracks to queue."""
         try:
             async with ctx.typing():
-                if 'playlist' in url:
-                    tracks, playlist_info = self.bot.spotify_client.get_playlist_tracks(url)
-                    if not tracks:
-                        return await ctx.send("�� No tracks found in playlist")
+                if 'playlist' in url or 'album' in url:
+                    # Pages are fetched off the event loop and queued as they arrive
+                    if 'playlist' in url:
+                        playlist_info, pages = await self.bot.spotify_client.stream_playlist(url)
+                    else:
+                        playlist_info, pages = await self.bot.spotify_client.stream_album(url)
+                    if not playlist_info['total_tracks']:
+                        return await ctx.send("❌ No tracks found in playlist")
                     
                     # Create playlist info embed
                     embed = discord.Embed(
@@ -91,25 +135,28 @@ class Music(commands.Cog):
                     )
                     embed.add_field(
                         name="Tracks",
-                        value=f"Adding {len(tracks)} songs to queue...",
+                        value=f"Adding {playlist_info['total_tracks']} songs to queue...",
                         inline=False
                     )
                     
                     status_msg = await ctx.send(embed=embed)
                     queue = await self.get_queue(ctx)
+                    added = 0
 
-                    # Add all tracks to queue first
-                    for track in tracks:
-                        track['requester'] = ctx.author
-                        queue.queue.append(track)
-
-                    # If nothing is playing, start the first track
-                    if not ctx.voice_client or not ctx.voice_client.is_playing():
-                        first_track = queue.queue.popleft()  # Remove first track from queue
-                        search_query = f"{first_track['title']} {first_track['artist']}"
-                        source = await YTDLSource.create_source(search_query, loop=self.bot.loop)
-                        source.requester = ctx.author
-                        await self.player.play_song(ctx, source)
+                    async for tracks in pages:
+                        for track in tracks:
+                            track['requester'] = ctx.author
+                            queue.append(track)
+                        added += len(tracks)
+
+                        # Start playback as soon as the first page is in
+                        if queue.queue and (not ctx.voice_client or not ctx.voice_client.is_playing()):
+                            first_track = queue.pop_left()  # Remove first track from queue
+                            self.get_player(ctx).queue_changed()
+                            source = await YTDLSource.from_spotify_track(first_track, loop=self.bot.loop)
+                            await self.get_player(ctx).play_song(ctx, source)
+                        else:
+                            self.get_player(ctx).queue_changed()
 
                     # Final status update
                     final_embed = discord.Embed(
@@ -119,15 +166,14 @@ class Music(commands.Cog):
                     )
                     final_embed.add_field(
                         name="Status",
-                        value=f"Successfully added {len(tracks)} tracks to queue",
+                        value=f"Successfully added {added} tracks to queue",
                         inline=False
                     )
                     await status_msg.edit(embed=final_embed)
                     
                 else:
                     # Single track processing...
-                    # (rest of single track code remains the same)
-                    track_info = self.bot.spotify_client.get_track_info(url)
+                    track_info = await self.bot.spotify_client.fetch_track(url)
                     tracks = [track_info]
                     
                     queue = await self.get_queue(ctx)
@@ -139,25 +185,24 @@ class Music(commands.Cog):
                     # If nothing is playing, process and play first track immediately
                     if not ctx.voice_client.is_playing():
                         try:
-                            search_query = f"{first_track['title']} {first_track['artist']}"
                             await ctx.send(f"🎵 Now playing: **{first_track['title']}**")
-                            source = await YTDLSource.create_source(search_query, loop=self.bot.loop)
-                            source.requester = ctx.author
-                            await self.player.play_song(ctx, source)
+                            source = await YTDLSource.from_spotify_track(first_track, loop=self.bot.loop)
+                            await self.get_player(ctx).play_song(ctx, source)
                         except Exception as e:
                             logging.error(f"Error processing first track: {e}")
                             await ctx.send("❌ Error processing first track")
                             return
                     else:
                         # If something is playing, add to queue
-                        queue.queue.append(first_track)
+                        queue.append(first_track)
+                        self.get_player(ctx).queue_changed()
                         await ctx.send(f"✅ Added **{first_track['title']}** to queue")
                     
                     # Add remaining tracks to queue
                     if len(tracks) > 1:
                         for track in tracks[1:]:
                             track['requester'] = ctx.author
-                            queue.queue.append(track)
+                            queue.append(track)
                         
                         await ctx.send(f"✅ Added {len(tracks)-1} more tracks to queue")
                     
@@ -177,6 +222,10 @@ class Music(commands.Cog):
             await ctx.author.voice.channel.connect()
             
         if not query:
+            queue = await self.get_queue(ctx)
+            if queue.queue and not (ctx.voice_client.is_playing() or ctx.voice_client.is_paused()):
+                # Start the queue, e.g. one restored after a restart
+                return await self.get_player(ctx).play_next(ctx)
             return await ctx.send("❌ No query provided.")
 
         try:
@@ -185,24 +234,27 @@ class Music(commands.Cog):
                 return
 
             async with ctx.typing():
-                source = await YTDLSource.create_source(query, loop=self.bot.loop)
-                source.requester = ctx.author
                 queue = await self.get_queue(ctx)
                 
                 if ctx.voice_client and ctx.voice_client.is_playing():
-                    # Add to queue if something is playing
-                    queue.queue.append(source)
-                    duration_str = format_duration(source.duration)
+                    # Add to queue if something is playing, the stream is only extracted once it is close to playing
+                    entry = await YTDLSource.create_entry(query, priority=self.get_priority(ctx))
+                    entry['requester'] = ctx.author
+                    queue.append(entry)
+                    self.get_player(ctx).queue_changed()
+                    duration_str = format_duration(entry['duration'])
                     embed = discord.Embed(
                         title="Added to Queue",
-                        description=f"**{source.title}**\nDuration: {duration_str}",
+                        description=f"**{entry['title']}**\nDuration: {duration_str}",
                         color=discord.Color.green()
                     )
                     embed.set_footer(text=f"Requested by {ctx.author.display_name}")
                     await ctx.send(embed=embed)
                 else:
                     # Start playing if nothing is playing
-                    await self.player.play_song(ctx, source)
+                    source = await YTDLSource.create_source(query, loop=self.bot.loop, priority=self.get_priority(ctx))
+                    source.requester = ctx.author
+                    await self.get_player(ctx).play_song(ctx, source)
                     
         except Exception as e:
             logging.error(f"Error in play command: {str(e)}", exc_info=True)
@@ -228,24 +280,27 @@ class Music(commands.Cog):
                     await ctx.send("❌ Playnext command doesn't support Spotify links! Use regular play instead.")
                     return
 
-                source = await YTDLSource.create_source(query, loop=self.bot.loop)
-                source.requester = ctx.author
                 queue = await self.get_queue(ctx)
                 
                 if ctx.voice_client and ctx.voice_client.is_playing():
-                    # Add to front of queue if something is playing
-                    queue.queue.appendleft(source)
-                    duration_str = format_duration(source.duration)
+                    # Add to front of queue if something is playing, the stream is only extracted once it is close to playing
+                    entry = await YTDLSource.create_entry(query, priority=self.get_priority(ctx))
+                    entry['requester'] = ctx.author
+                    queue.appendleft(entry)
+                    self.get_player(ctx).queue_changed()
+                    duration_str = format_duration(entry['duration'])
                     embed = discord.Embed(
                         title="Added to Play Next",
-                        description=f"**{source.title}**\nDuration: {duration_str}",
+                        description=f"**{entry['title']}**\nDuration: {duration_str}",
                         color=discord.Color.green()
                     )
                     embed.set_footer(text=f"Requested by {ctx.author.display_name}")
                     await ctx.send(embed=embed)
                 else:
                     # Start playing if nothing is playing
-                    await self.player.play_song(ctx, source)
+                    source = await YTDLSource.create_source(query, loop=self.bot.loop, priority=self.get_priority(ctx))
+                    source.requester = ctx.author
+                    await self.get_player(ctx).play_song(ctx, source)
                     
         except Exception as e:
             logging.error(f"Error in playnext command: {str(e)}", exc_info=True)
@@ -265,7 +320,7 @@ class Music(commands.Cog):
             return await ctx.send("⏸️ Music is already paused!")
             
         if ctx.voice_client.is_playing():
-            ctx.voice_client.pause()
+            self.get_player(ctx).pause(ctx.voice_client)
             await ctx.send("⏸️ Playback paused!")
         else:
             await ctx.send("❌ Nothing is playing!")
@@ -284,12 +339,90 @@ class Music(commands.Cog):
             return await ctx.send("▶️ Music is already playing!")
             
         if ctx.voice_client.is_paused():
-            ctx.voice_client.resume()
+            self.get_player(ctx).resume(ctx.voice_client)
             await ctx.send("▶️ Resuming playback!")
         else:
             await ctx.send("❌ Nothing to resume!")
 
 
+    async def seek_to(self, ctx, position):
+        """Jump to a position in the current song and report it."""
+        if not ctx.voice_client or not (ctx.voice_client.is_playing() or ctx.voice_client.is_paused()):
+            return await ctx.send("❌ No song is currently playing!")
+
+        try:
+            position = self.get_player(ctx).seek(position)
+        except Exception as e:
+            logging.error(f"Error seeking: {e}")
+            return await ctx.send("❌ Failed to seek")
+        if position is None:
+            return await ctx.send("❌ No song is currently playing!")
+        await ctx.send(f"⏩ Jumped to {format_duration(position)}")
+
+    @commands.command(name='seek')
+    async def seek(self, ctx, *, time=None):
+        """Jump to a time in the current song, in seconds, M:SS or H:MM:SS."""
+        try:
+            position = parse_duration(time or '')
+        except ValueError:
+            return await ctx.send("❌ Give a time like `90` or `1:30`")
+        await self.seek_to(ctx, position)
+
+    @commands.command(name='ff', aliases=['forward'])
+    async def fast_forward(self, ctx, seconds: float = 10):
+        """Skip ahead in the current song."""
+        await self.seek_to(ctx, self.get_player(ctx).get_position() + seconds)
+
+    @commands.command(name='rewind', aliases=['rw'])
+    async def rewind(self, ctx, seconds: float = 10):
+        """Go back in the current song."""
+        await self.seek_to(ctx, self.get_player(ctx).get_position() - seconds)
+
+
+    @commands.command(name='volume', aliases=['vol', 'v'])
+    async def volume(self, ctx, level: int = None):
+        """Show or set the playback volume, 0 to 200%."""
+        queue = await self.get_queue(ctx)
+        if level is None:
+            return await ctx.send(f"🔊 Volume: {int(queue.volume * 100)}%")
+        if not 0 <= level <= MAX_VOLUME * 100:
+            return await ctx.send(f"❌ Volume must be between 0 and {int(MAX_VOLUME * 100)}")
+
+        queue.volume = level / 100
+        self.get_player(ctx).filters_changed()
+        await ctx.send(f"🔊 Volume set to {level}%")
+
+    @commands.command(name='eq')
+    async def equalizer(self, ctx, preset=None):
+        """Show or set the equalizer preset."""
+        queue = await self.get_queue(ctx)
+        presets = ", ".join(f"`{name}`" for name in EQ_PRESETS)
+        if preset is None:
+            return await ctx.send(f"🎚️ Equalizer: `{queue.filters.eq}` (presets: {presets})")
+        preset = preset.lower()
+        if preset not in EQ_PRESETS:
+            return await ctx.send(f"❌ Unknown preset, choose one of {presets}")
+
+        queue.filters.eq = preset
+        self.get_player(ctx).filters_changed()
+        await ctx.send(f"🎚️ Equalizer set to `{preset}`")
+
+    @commands.command(name='normalize', aliases=['norm'])
+    async def normalize(self, ctx, mode=None):
+        """Toggle loudness normalization, or set it with on/off."""
+        queue = await self.get_queue(ctx)
+        if mode is None:
+            enabled = not queue.filters.normalize
+        elif mode.lower() in ('on', 'off'):
+            enabled = mode.lower() == 'on'
+        else:
+            return await ctx.send("❌ Use `on` or `off`")
+
+        queue.filters.normalize = enabled
+        self.get_player(ctx).filters_changed()
+        await ctx.send(f"📶 Loudness normalization {'on' if enabled else 'off'}")
+
+
     @commands.command(name='skip', aliases=['s'])
     async def skip(self, ctx):
         """Skip the current song."""
@@ -298,7 +431,7 @@ class Music(commands.Cog):
             
         queue = await self.get_queue(ctx)
         if not queue.queue:
-            ctx.voice_client.stop()
+            self.get_player(ctx).skip(ctx.voice_client)
             return await ctx.send("⏭️ Song skipped.")
             
         # Get next song info before stopping current
@@ -306,7 +439,7 @@ class Music(commands.Cog):
         next_song_name = next_song['title'] if isinstance(next_song, dict) else next_song.title
             
         # Stop current song (this will trigger play_next via the after callback)
-        ctx.voice_client.stop()
+        self.get_player(ctx).skip(ctx.voice_client)
         await ctx.send(f"⏭️ Skipping to **{next_song_name}**!")
 
     
@@ -318,7 +451,7 @@ class Music(commands.Cog):
 
         try:
             # Get current track info from player
-            track_data = self.player.get_current_track()
+            track_data = self.get_player(ctx).get_current_track()
             if not track_data:
                 return await ctx.send("❌ No track information available!")
 
@@ -326,16 +459,12 @@ class Music(commands.Cog):
             from views.now_playing_view import NowPlayingView
             
             # Stop previous view if exists
-            if hasattr(self.bot, 'current_np_view') and self.bot.current_np_view:
-                self.bot.current_np_view.stop()
-                if hasattr(self.bot.current_np_view, 'message'):
-                    try:
-                        await self.bot.current_np_view.message.delete()
-                    except:
-                        pass
+            player = self.get_player(ctx)
+            if player.np_view:
+                player.np_view.stop()
 
             # Create new view
-            view = NowPlayingView(ctx, self.bot, track_data)
+            view = NowPlayingView(ctx, self.bot, track_data, player)
             await view.start()
 
         except Exception as e:
@@ -363,40 +492,11 @@ class Music(commands.Cog):
             return await ctx.send("��� Queue is empty!")
             
         try:
-            queue_list = list(queue.queue)
-            tracks_by_user = {}
-            
-            # Group tracks by requester
-            for track in queue_list:
-                if isinstance(track, dict):
-                    requester = track.get('requester', ctx.author)
-                else:
-                    requester = getattr(track, 'requester', ctx.author)
-                    
-                requester_id = getattr(requester, 'id', 'unknown')
-                if requester_id not in tracks_by_user:
-                    tracks_by_user[requester_id] = []
-                tracks_by_user[requester_id].append(track)
-            
-            # Shuffle each user's tracks
-            for tracks in tracks_by_user.values():
-                random.shuffle(tracks)
+            # Shuffle each user's tracks and interleave them
+            shuffled_count = queue.shuffle()
+            self.get_player(ctx).queue_changed()
             
-            # Interleave tracks
-            shuffled_tracks = []
-            max_tracks = max(len(tracks) for tracks in tracks_by_user.values())
-            
-            for i in range(max_tracks):
-                for user_id in tracks_by_user:
-                    if i < len(tracks_by_user[user_id]):
-                        shuffled_tracks.append(tracks_by_user[user_id][i])
-            
-            # Update queue
-            queue.queue.clear()
-            queue.queue.extend(shuffled_tracks)
-            queue.shuffle_count += 1
-            
-            await ctx.send(f"🔀 Successfully shuffled {len(shuffled_tracks)} tracks!")
+            await ctx.send(f"🔀 Successfully shuffled {shuffled_count} tracks!")
             
         except Exception as e:
             logging.error(f"Error in shuffle command: {e}")
@@ -423,7 +523,8 @@ class Music(commands.Cog):
             reaction, user = await self.bot.wait_for('reaction_add', timeout=30.0, check=check)
             
             if str(reaction.emoji) == '✅':
-                queue.queue.clear()
+                queue.clear()
+                self.get_player(ctx).queue_changed()
                 await confirm_msg.delete()
                 await ctx.send("🗑️ Queue has been cleared successfully!")
             else:
@@ -456,7 +557,8 @@ class Music(commands.Cog):
         song_name = song['title'] if isinstance(song, dict) else song.title
         
         # Move it to the front of the queue
-        queue.queue.appendleft(song)
+        queue.appendleft(song)
+        self.get_player(ctx).queue_changed()
         
         # Skip current song to play the selected one
         await ctx.send(f"⏭️ Skipping to **{song_name}**...")
@@ -464,13 +566,22 @@ class Music(commands.Cog):
 
 
     @commands.command(name='repeat', aliases=['r'])
-    async def repeat(self, ctx):
-        """Toggle repeat mode for the queue."""
+    async def repeat(self, ctx, mode=None):
+        """Set repeat to off, queue or track, or cycle through them."""
         queue = await self.get_queue(ctx)
-        queue.loop = not queue.loop
-        
-        if queue.loop:
-            await ctx.send("🔁 Repeat mode enabled - Queue will loop")
+        if mode is None:
+            queue.loop = LoopMode((queue.loop + 1) % len(LoopMode))
+        elif mode.lower() in ('off', 'queue', 'track'):
+            queue.loop = LoopMode[mode.upper()]
+        else:
+            return await ctx.send("❌ Use `off`, `queue` or `track`")
+        # The track opened ahead of time may no longer be the one due next
+        self.get_player(ctx).queue_changed()
+
+        if queue.loop == LoopMode.QUEUE:
+            await ctx.send("🔁 Repeat mode: queue - Played tracks go to the back of the queue")
+        elif queue.loop == LoopMode.TRACK:
+            await ctx.send("🔂 Repeat mode: track - The current track plays again")
         else:
             await ctx.send("➡️ Repeat mode disabled")
 
@@ -487,17 +598,15 @@ class Music(commands.Cog):
         if ctx.message.mentions:
             target_user = ctx.message.mentions[0]
             # Count songs by this user
-            user_songs = [song for song in queue.queue 
-                         if (isinstance(song, dict) and song.get('requester', None) == target_user) or
-                            (hasattr(song, 'requester') and song.requester == target_user)]
+            user_song_count = queue.count_by(target_user)
             
-            if not user_songs:
+            if not user_song_count:
                 return await ctx.send(f"❌ No songs found by {target_user.mention} in the queue!")
 
             # Create confirmation message
             confirm_embed = discord.Embed(
                 title="⚠️ Remove User's Songs",
-                description=f"Are you sure you want to remove all {len(user_songs)} songs requested by {target_user.mention}?",
+                description=f"Are you sure you want to remove all {user_song_count} songs requested by {target_user.mention}?",
                 color=discord.Color.yellow()
             )
             confirm_msg = await ctx.send(embed=confirm_embed)
@@ -512,11 +621,8 @@ class Music(commands.Cog):
                 
                 if str(reaction.emoji) == '✅':
                     # Remove all songs by the user
-                    original_length = len(queue.queue)
-                    queue.queue = deque([song for song in queue.queue 
-                                      if (isinstance(song, dict) and song.get('requester', None) != target_user) or
-                                         (hasattr(song, 'requester') and song.requester != target_user)])
-                    removed_count = original_length - len(queue.queue)
+                    removed_count = queue.remove_requester(target_user)
+                    self.get_player(ctx).queue_changed()
                     
                     await confirm_msg.delete()
                     await ctx.send(f"✅ Removed {removed_count} songs requested by {target_user.mention}")
@@ -534,6 +640,7 @@ class Music(commands.Cog):
                 index = int(target) - 1
                 if 0 <= index < len(queue.queue):
                     removed = queue.pop_at(index)
+                    self.get_player(ctx).queue_changed()
                     if removed:
                         title = removed['title'] if isinstance(removed, dict) else removed.title
                         await ctx.send(f"✅ Removed **{title}** from queue")
@@ -552,4 +659,59 @@ class Music(commands.Cog):
             await ctx.voice_client.disconnect()
             await ctx.send("👋 Disconnected from voice channel!")
         else:
-            await ctx.send("❌ Not connected to any voice channel!")
\ No newline at end of file
+            await ctx.send("❌ Not connected to any voice channel!")
+
+    @commands.command(name='stats')
+    async def stats(self, ctx):
+        """Show bot performance stats."""
+        stats = await self.bot.get_cluster_stats()
+        embed = discord.Embed(title="📊 TuneBot Stats", color=discord.Color.blue())
+
+        embed.add_field(
+            name="Bot",
+            value=(
+                f"Guilds: {stats.get('guilds', 0)} | Players: {stats.get('players', 0)}\n"
+                f"Voice: {stats.get('voice_clients', 0)} | Queued: {stats.get('queued_tracks', 0)}\n"
+                f"Latency: {stats.get('latency_ms', 0)} ms | "
+                f"Ready in: {self.bot.startup_seconds or 0:.1f} s\n"
+                f"Passthrough streams: {stats.get('passthrough_streams', 0)} | "
+                f"Stream CPU: {stats.get('stream_cpu_percent', 0)}%"
+            ),
+            inline=False
+        )
+
+        timings = []
+        for name, label in STATS_TIMINGS:
+            snapshot = metrics.snapshot(name)
+            if snapshot:
+                count, average, p95 = snapshot
+                timings.append(f"{label}: avg {average * 1000:.1f} ms | p95 ≤ {p95 * 1000:.0f} ms ({count})")
+        embed.add_field(name="Timings", value="\n".join(timings) or "No data yet", inline=False)
+
+        cache = extraction_cache.stats()
+        matches = match_index.stats()
+        sponsorblock = sponsorblock_handler.stats()
+        embed.add_field(
+            name="Caches",
+            value=(
+                f"Extraction: {cache['hits']} hits / {cache['misses']} misses\n"
+                f"Spotify matches: {matches['hits']} hits / {matches['misses']} misses\n"
+                f"SponsorBlock: {sponsorblock['hits']} hits / {sponsorblock['misses']} misses / "
+                f"{sponsorblock['timeouts']} over budget"
+            ),
+            inline=False
+        )
+
+        watchdog = self.bot.watchdog
+        if watchdog and watchdog.offenders:
+            offenders = "\n".join(
+                f"`{location}`: {offender['count']}x, max {offender['max'] * 1000:.0f} ms"
+                for location, offender in watchdog.top(3)
+            )
+            embed.add_field(name=f"Event Loop Stalls ({watchdog.stalls})", value=offenders[:1024], inline=False)
+
+        gaps = self.get_player(ctx).get_transition_stats()
+        if gaps:
+            embed.set_footer(text=f"This server: avg track gap {gaps['avg']:.1f} ms over {gaps['count']} transitions")
+
+        await ctx.send(embed=embed)
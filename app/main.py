@@ -1,14 +1,39 @@
+import time
+# Taken before the heavy imports so the time to ready includes them
+STARTED = time.perf_counter()
+
 import os
+import math
 import discord
 import asyncio
 import logging
+import multiprocessing
 from discord.ext import commands
 from models.spotify_client import SpotifyClient
+from models.player_registry import PlayerRegistry
+from models.queue_store import queue_store
+from utils.cluster import ClusterStats, fetch_gateway_info
+from views.refresh_scheduler import RefreshScheduler
+from utils.sponsorblock import sponsorblock_handler
+from utils.metrics import METRICS_PORT, metrics, monitor_loop_lag, start_metrics_server
+from utils.stall_watchdog import StallWatchdog
+
+# The only logging setup, modules just log
+logging.basicConfig(
+    level=os.getenv('LOG_LEVEL', 'ERROR').upper(),
+    format='%(asctime)s %(levelname)s %(name)s: %(message)s'
+)
 
-logging.basicConfig(level=logging.ERROR)
+# Total shards, defaults to Discord's recommendation
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', '0')) or None
+# Shards run by each worker process, 0 runs every shard in this process
+SHARDS_PER_PROCESS = int(os.getenv('SHARDS_PER_PROCESS', '0'))
+# Seconds between identify batches, Discord allows max_concurrency per 5 seconds
+IDENTIFY_DELAY = 5
+STATS_INTERVAL = 30
 
-class MusicBot(commands.Bot):
-    def __init__(self):
+class MusicBot(commands.AutoShardedBot):
+    def __init__(self, shard_ids=None, shard_count=None, cluster=None):
         prefix = os.getenv('DISCORD_PREFIX', '/')
         intents = discord.Intents.default()
         intents.message_content = True
@@ -17,14 +42,22 @@ class MusicBot(commands.Bot):
         super().__init__(
             command_prefix=prefix,
             intents=intents,
-            help_command=None
+            help_command=None,
+            shard_ids=shard_ids,
+            shard_count=shard_count
         )
         
+        # Queues and players only hold guilds on this process's shards
+        self.cluster = cluster
         self.music_queues = {}
+        self.players = PlayerRegistry(self)
+        self.refresh_scheduler = RefreshScheduler(self)
         self.spotify_client = SpotifyClient()
         self._initialized = False
         self._shutdown_event = asyncio.Event()
-        self.current_np_view = None
+        self._metrics_runner = None
+        self.watchdog = None
+        self.startup_seconds = None
     
     async def setup_hook(self):
         """Initialize cogs and configurations."""
@@ -35,6 +68,20 @@ class MusicBot(commands.Bot):
             # Load music cog
             from cogs.music import Music
             await self.add_cog(Music(self))
+            self.players.start()
+            queue_store.start(self)
+            if self.cluster:
+                self.loop.create_task(self.publish_stats())
+            self.loop.create_task(monitor_loop_lag())
+            self.watchdog = StallWatchdog(self.loop)
+            self.watchdog.start()
+            # Each cluster worker serves its own shards on METRICS_PORT + worker id
+            port = METRICS_PORT
+            if port and self.cluster:
+                port += self.cluster.worker_id
+            self._metrics_runner = await start_metrics_server(
+                self.get_stats, pages={'/stalls': self.watchdog.report}, port=port
+            )
 
             # Register help command
             @self.command(name='help', aliases=['h'])
@@ -46,12 +93,17 @@ class MusicBot(commands.Bot):
                 )
 
                 music_controls = (
-                    f"`play` (`p`) - Play music or add to queue\n"
+                    f"`play` (`p`) - Play music or add to queue, or start the queue\n"
                     f"`playnext` (`pn`) - Add song to play next\n"
                     f"`pause` - Pause playback\n"
                     f"`resume` - Resume playback\n"
                     f"`skip` (`s`) - Skip to next song\n"
                     f"`nowplaying` (`np`) - Show current song info\n"
+                    f"`seek <time>` - Jump to a time in the song\n"
+                    f"`ff [seconds]` / `rewind` (`rw`) `[seconds]` - Skip ahead or back (default 10)\n"
+                    f"`volume` (`v`) `[0-200]` - Show or set volume\n"
+                    f"`eq [preset]` - Equalizer: flat, bass, treble, vocal, soft\n"
+                    f"`normalize` (`norm`) - Toggle loudness normalization\n"
                 )
                 embed.add_field(name="Music Controls", value=music_controls, inline=False)
 
@@ -60,13 +112,14 @@ class MusicBot(commands.Bot):
                     f"`shuffle` (`sh`) - Randomize queue\n"
                     f"`clear` (`c`) - Empty the queue\n"
                     f"`playnum <number>` - Play specific song number\n"
-                    f"`repeat` (`r`) - Toggle queue loop"
+                    f"`repeat` (`r`) `[off|queue|track]` - Loop the queue or the current track\n"
                     f"`remove` (`rm`)` - Remove specific song from queue, or all songs play a user"
                 )
                 embed.add_field(name="Queue Controls", value=queue_controls, inline=False)
 
                 system_controls = (
-                    f"`disconnect` (`dc`) - Leave channel\n",
+                    f"`disconnect` (`dc`) - Leave channel\n"
+                    f"`stats` - Show bot performance stats\n"
                     f"`help` (`h`) - Show help message"
                 )
                 embed.add_field(name="System Controls", value=system_controls, inline=False)
@@ -74,9 +127,10 @@ class MusicBot(commands.Bot):
                 examples = (
                     f"`{ctx.prefix}p never gonna give you up` - Search & play\n"
                     f"`{ctx.prefix}p https://youtu.be/...` - Play URL\n"
-                    f"`{ctx.prefix}ff 45` - Jump to 45 seconds\n"
-                    f"`{ctx.prefix}playnum 3` - Play queue item #3"
-                    f"`{ctx.prefix}rm 3` - Remove queue item #3"
+                    f"`{ctx.prefix}seek 1:30` - Jump to 1:30\n"
+                    f"`{ctx.prefix}ff 45` - Skip ahead 45 seconds\n"
+                    f"`{ctx.prefix}playnum 3` - Play queue item #3\n"
+                    f"`{ctx.prefix}rm 3` - Remove queue item #3\n"
                     f"`{ctx.prefix}rm @user` - Remove all queue items by user"
                 )
                 embed.add_field(name="Examples", value=examples, inline=False)
@@ -92,28 +146,82 @@ class MusicBot(commands.Bot):
     
     async def on_ready(self):
         """Called when the bot is ready."""
+        if self.startup_seconds is None:
+            # First ready only, later ones are reconnects
+            self.startup_seconds = time.perf_counter() - STARTED
+            metrics.observe('startup_seconds', self.startup_seconds)
+            logging.info(f"Ready in {self.startup_seconds:.2f} s")
+            # Authenticate with Spotify now that the gateway is up
+            self.spotify_client.start()
+
         activity = discord.Activity(
             type=discord.ActivityType.playing,
             name=f"music | {self.command_prefix}help"
         )
         await self.change_presence(activity=activity)
 
+    async def on_command(self, ctx):
+        """Give command replies priority over now playing refreshes."""
+        if ctx.guild:
+            self.refresh_scheduler.command_activity(ctx.guild.id)
+
+    def get_stats(self):
+        """Get this process's stats."""
+        streams = [stats for stats in (player.get_stream_stats() for player in self.players.values()) if stats]
+        return {
+            'shards': len(self.shards),
+            'guilds': len(self.guilds),
+            'voice_clients': len(self.voice_clients),
+            'players': len(self.players),
+            'queued_tracks': sum(len(queue.queue) for queue in self.music_queues.values()),
+            'latency_ms': 0 if math.isnan(self.latency) else round(self.latency * 1000),
+            'passthrough_streams': sum(1 for stats in streams if stats['passthrough']),
+            'stream_cpu_percent': round(sum(stats['cpu_percent'] for stats in streams), 2)
+        }
+
+    async def get_cluster_stats(self):
+        """Get stats combined across every worker process."""
+        if not self.cluster:
+            return self.get_stats()
+        return await self.cluster.totals()
+
+    async def publish_stats(self):
+        """Periodically share this worker's stats with the other processes."""
+        await self.wait_until_ready()
+        while not self.is_closed():
+            await self.cluster.publish(self.get_stats())
+            await asyncio.sleep(STATS_INTERVAL)
+
     async def close(self):
         """Clean shutdown."""
+        # Save while the players still know their positions
+        queue_store.close()
+        try:
+            await queue_store.save(self)
+        except Exception as e:
+            logging.error(f"Error saving queues on shutdown: {e}")
+
         for guild in self.guilds:
             if guild.voice_client:
                 await guild.voice_client.disconnect()
 
-        if self.current_np_view:
-            self.current_np_view.stop()
+        self.refresh_scheduler.close()
+        self.players.close()
+        await sponsorblock_handler.close()
+        if self._metrics_runner:
+            await self._metrics_runner.cleanup()
+        if self.watchdog:
+            self.watchdog.stop()
+            if self.watchdog.stalls:
+                logging.warning(self.watchdog.report(stacks=False))
 
         self.music_queues.clear()
 
         await super().close()
 
-async def main():
+async def main(shard_ids=None, shard_count=SHARD_COUNT, cluster=None):
     """Main async function to run the bot."""
-    bot = MusicBot()
+    bot = MusicBot(shard_ids=shard_ids, shard_count=shard_count, cluster=cluster)
     
     token = os.getenv('DISCORD_BOT_TOKEN')
     if not token:
@@ -129,8 +237,70 @@ async def main():
         if not bot.is_closed():
             await bot.close()
 
+def run_worker(worker_id, shard_ids, shard_count, shared_stats):
+    """Entry point of a worker process running a slice of the shards."""
+    try:
+        asyncio.run(main(shard_ids, shard_count, ClusterStats(shared_stats, worker_id)))
+    except KeyboardInterrupt:
+        pass
+
+def run_cluster(shards_per_process):
+    """Split the shards across worker processes and keep them running."""
+    token = os.getenv('DISCORD_BOT_TOKEN')
+    if not token:
+        raise ValueError("No Discord token found in environment variables!")
+
+    shard_count, max_concurrency = asyncio.run(fetch_gateway_info(token))
+    shard_count = SHARD_COUNT or shard_count
+    groups = [
+        list(range(start, min(start + shards_per_process, shard_count)))
+        for start in range(0, shard_count, shards_per_process)
+    ]
+
+    context = multiprocessing.get_context('spawn')
+    manager = context.Manager()
+    shared_stats = manager.dict()
+    workers = {}
+
+    def start_worker(worker_id):
+        process = context.Process(
+            target=run_worker,
+            args=(worker_id, groups[worker_id], shard_count, shared_stats),
+            name=f"tunebot-worker-{worker_id}"
+        )
+        process.start()
+        workers[worker_id] = process
+        # Stay within Discord's identify rate limit before starting the next worker
+        time.sleep(IDENTIFY_DELAY * math.ceil(len(groups[worker_id]) / max_concurrency))
+
+    try:
+        for worker_id in range(len(groups)):
+            start_worker(worker_id)
+
+        while workers:
+            time.sleep(IDENTIFY_DELAY)
+            for worker_id, process in list(workers.items()):
+                if process.is_alive():
+                    continue
+                if process.exitcode == 0:
+                    del workers[worker_id]
+                else:
+                    logging.error(f"Worker {worker_id} exited with {process.exitcode}, restarting")
+                    start_worker(worker_id)
+    except KeyboardInterrupt:
+        logging.info("Shutdown requested...")
+    finally:
+        for process in workers.values():
+            process.terminate()
+        for process in workers.values():
+            process.join()
+        manager.shutdown()
+
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        if SHARDS_PER_PROCESS > 0:
+            run_cluster(SHARDS_PER_PROCESS)
+        else:
+            asyncio.run(main())
     except KeyboardInterrupt:
         pass
\ No newline at end of file
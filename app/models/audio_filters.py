@@ -0,0 +1,30 @@
+import os
+
+# Loudness normalization for guilds that haven't chosen
+NORMALIZE_DEFAULT = os.getenv('NORMALIZE', '0') == '1'
+MAX_VOLUME = 2.0
+
+# Preset -> (low shelf dB, high shelf dB)
+EQ_PRESETS = {
+    'flat': (0, 0),
+    'bass': (6, 0),
+    'treble': (0, 6),
+    'vocal': (-3, 3),
+    'soft': (0, -6),
+}
+
+
+class AudioFilters:
+    """A guild's volume, EQ preset and loudness normalization setting.
+
+    The PCM filter stage reads these on every frame, so changes apply to
+    the track that is playing within 20 ms.
+    """
+    def __init__(self, volume=1.0, eq='flat', normalize=NORMALIZE_DEFAULT):
+        self.volume = volume
+        self.eq = eq
+        self.normalize = normalize
+
+    def is_neutral(self):
+        """Check if the filters leave the audio untouched, which allows Opus passthrough."""
+        return self.volume == 1.0 and self.eq == 'flat' and not self.normalize
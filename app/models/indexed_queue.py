@@ -0,0 +1,166 @@
+from itertools import chain, islice
+
+# Target number of entries per block; blocks split at twice this size
+BLOCK_SIZE = 256
+
+
+class IndexedQueue:
+    """Deque-like sequence with O(log n) positional access, insert and delete.
+
+    Entries are stored in a list of blocks of at most 2 * BLOCK_SIZE items,
+    with a Fenwick tree over the block lengths to find which block holds a
+    given position. Positional operations touch one block plus the tree,
+    and slicing costs O(log n + k) instead of copying the whole queue.
+    """
+    def __init__(self, iterable=()):
+        self._blocks = []
+        self._tree = []
+        self._len = 0
+        self._load(list(iterable))
+
+    def _load(self, items):
+        """Rebuild the blocks from a flat list."""
+        self._blocks = [items[i:i + BLOCK_SIZE] for i in range(0, len(items), BLOCK_SIZE)]
+        self._len = len(items)
+        self._rebuild_tree()
+
+    def _rebuild_tree(self):
+        """Recompute the Fenwick tree after blocks were added or removed."""
+        tree = [0] * (len(self._blocks) + 1)
+        for i, block in enumerate(self._blocks, start=1):
+            tree[i] += len(block)
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _update(self, block_index, delta):
+        i = block_index + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _locate(self, index):
+        """Get (block index, offset in block) for a position."""
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError('queue index out of range')
+
+        position = 0
+        step = 1 << (len(self._tree) - 1).bit_length()
+        while step:
+            nxt = position + step
+            if nxt < len(self._tree) and self._tree[nxt] <= index:
+                position = nxt
+                index -= self._tree[nxt]
+            step >>= 1
+        return position, index
+
+    def _after_remove(self, block_index):
+        """Drop an emptied block and compact if blocks became fragmented."""
+        if not self._blocks[block_index]:
+            del self._blocks[block_index]
+            if len(self._blocks) > 4 * (self._len // BLOCK_SIZE) + 4:
+                self._load(list(self))
+            else:
+                self._rebuild_tree()
+
+    def __len__(self):
+        return self._len
+
+    def __bool__(self):
+        return self._len > 0
+
+    def __iter__(self):
+        return chain.from_iterable(self._blocks)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._len)
+            if step != 1:
+                return list(self)[index]
+            if start >= stop:
+                return []
+            block_index, offset = self._locate(start)
+            items = chain(islice(self._blocks[block_index], offset, None),
+                          chain.from_iterable(self._blocks[block_index + 1:]))
+            return list(islice(items, stop - start))
+
+        block_index, offset = self._locate(index)
+        return self._blocks[block_index][offset]
+
+    def __delitem__(self, index):
+        self.pop(index)
+
+    def append(self, item):
+        """Add an item to the end."""
+        if not self._blocks or len(self._blocks[-1]) >= 2 * BLOCK_SIZE:
+            self._blocks.append([item])
+            self._len += 1
+            self._rebuild_tree()
+            return
+        self._blocks[-1].append(item)
+        self._len += 1
+        self._update(len(self._blocks) - 1, 1)
+
+    def appendleft(self, item):
+        """Add an item to the front."""
+        self.insert(0, item)
+
+    def extend(self, items):
+        """Add items to the end."""
+        for item in items:
+            self.append(item)
+
+    def insert(self, index, item):
+        """Insert an item before a position."""
+        if index >= self._len or not self._blocks:
+            self.append(item)
+            return
+        index = max(0, index + self._len if index < 0 else index)
+
+        block_index, offset = self._locate(index)
+        block = self._blocks[block_index]
+        block.insert(offset, item)
+        self._len += 1
+        if len(block) > 2 * BLOCK_SIZE:
+            self._blocks[block_index:block_index + 1] = [block[:BLOCK_SIZE], block[BLOCK_SIZE:]]
+            self._rebuild_tree()
+        else:
+            self._update(block_index, 1)
+
+    def pop(self, index=-1):
+        """Remove and return the item at a position."""
+        block_index, offset = self._locate(index)
+        item = self._blocks[block_index].pop(offset)
+        self._len -= 1
+        self._update(block_index, -1)
+        self._after_remove(block_index)
+        return item
+
+    def popleft(self):
+        """Remove and return the first item."""
+        return self.pop(0)
+
+    def remove(self, item):
+        """Remove the first occurrence of an item, compared by identity."""
+        for block_index, block in enumerate(self._blocks):
+            for offset, queued in enumerate(block):
+                if queued is item:
+                    del block[offset]
+                    self._len -= 1
+                    self._update(block_index, -1)
+                    self._after_remove(block_index)
+                    return
+        raise ValueError('item not in queue')
+
+    def retain(self, predicate):
+        """Keep only the items matching a predicate, in one pass."""
+        self._load([item for item in self if predicate(item)])
+
+    def clear(self):
+        """Remove every item."""
+        self._blocks = []
+        self._tree = [0]
+        self._len = 0
@@ -1,19 +1,81 @@
-import discord
 import asyncio
 import logging
-from models.yt_source import YTDLSource, FFMPEG_OPTIONS
-from utils.format import format_duration
+from models.yt_source import YTDLSource
+from models.prefetcher import Prefetcher
+from models.playback_engine import PlaybackEngine
+from models.audio_filters import AudioFilters
+from models.music_queue import LoopMode
+from utils.audio_cache import audio_cache
+from utils.metrics import metrics
+from collections import deque
+from enum import Enum
 import time
 
-logging.basicConfig(level=logging.ERROR)
+class PlayerState(Enum):
+    """Playback states of a guild's player."""
+    IDLE = 'idle'
+    RESOLVING = 'resolving'
+    PLAYING = 'playing'
+    PAUSED = 'paused'
+    TRANSITIONING = 'transitioning'
+
+# Allowed moves of the playback state machine
+STATE_TRANSITIONS = {
+    PlayerState.IDLE: {PlayerState.RESOLVING, PlayerState.PLAYING, PlayerState.TRANSITIONING},
+    PlayerState.RESOLVING: {PlayerState.PLAYING, PlayerState.IDLE},
+    PlayerState.PLAYING: {PlayerState.PAUSED, PlayerState.TRANSITIONING, PlayerState.IDLE},
+    PlayerState.PAUSED: {PlayerState.PLAYING, PlayerState.TRANSITIONING, PlayerState.IDLE},
+    PlayerState.TRANSITIONING: {PlayerState.RESOLVING, PlayerState.PLAYING, PlayerState.IDLE},
+}
 
 class MusicPlayer:
-    def __init__(self, bot):
+    """Playback state and now playing view for a single guild."""
+    def __init__(self, bot, guild_id):
         self.bot = bot
+        self.guild_id = guild_id
+        self.state = PlayerState.IDLE
+        self.last_active = time.monotonic()
+        self.np_view = None
         self._current = None
-        self._current_view = None
         self._current_source = None
         self._position = 0
+        self._prefetcher = None
+        self._engine = None
+        self._preload_entry = None
+        self._replay = None
+        self._skipping = False
+        self.transition_gaps = deque(maxlen=100)
+
+    def set_state(self, state):
+        """Move the player to a new playback state."""
+        self.last_active = time.monotonic()
+        if state is self.state:
+            return
+        if state not in STATE_TRANSITIONS[self.state]:
+            logging.warning(f"Guild {self.guild_id}: unexpected state change {self.state.value} -> {state.value}")
+        self.state = state
+
+    def get_prefetcher(self):
+        """Get the guild's prefetcher."""
+        queue = self.bot.music_queues[self.guild_id]
+        if self._prefetcher is None or self._prefetcher.queue is not queue:
+            if self._prefetcher:
+                self._prefetcher.clear()
+            self._prefetcher = Prefetcher(self.bot, queue)
+        return self._prefetcher
+
+    def queue_changed(self):
+        """Notify the player that the guild's queue was modified."""
+        queue = self.bot.music_queues.get(self.guild_id)
+        if not queue:
+            return
+        self.last_active = time.monotonic()
+        self.get_prefetcher().sync()
+
+        # Reopen the upcoming track if a different one is now due next
+        if self._engine and self._preload_entry is not self._peek_next(queue):
+            self._preload_entry = None
+            self._engine.invalidate_next()
 
     def _store_track_info(self, source):
         """Store current track information."""
@@ -39,25 +101,28 @@ class MusicPlayer:
                 'position': 0
             }
             self._current_source = source
+            self._replay = None
             self._position = 0
             
         except Exception as e:
             logging.error(f"Error storing track info: {e}")
             self._current = None
 
+    def _record_play(self, source):
+        """Count a play so popular tracks get cached locally."""
+        try:
+            audio_cache.record_play(getattr(source, 'video_id', None), getattr(source, 'url', None))
+        except Exception as e:
+            logging.error(f"Error recording play: {e}")
+
     def get_current_track(self):
         """Get current track info."""
         if not self._current:
             return None
         
         try:
-            # Update position if available
-            if self._current_source:
-                if hasattr(self._current_source, '_player'):
-                    self._position = getattr(self._current_source._player, 'pos', self._position)
-                elif hasattr(self._current_source, 'original'):
-                    self._position = getattr(self._current_source.original, 'pos', self._position)
-            
+            if self._engine:
+                self._position = self.get_position()
             self._current['position'] = self._position
             return self._current
             
@@ -65,102 +130,286 @@ class MusicPlayer:
             logging.error(f"Error getting current track: {e}")
             return self._current
 
-    async def process_spotify_playlist(self, tracks, ctx):
-        """Process tracks from Spotify playlist."""
-        queue = self.bot.music_queues[ctx.guild.id]
-        
-        # Add all tracks to queue
-        for track in tracks:
-            track['requester'] = ctx.author
-            queue.queue.append(track)
-            
-        # If nothing is playing, start the first track
-        if not ctx.voice_client.is_playing():
-            first_track = queue.queue.popleft()
-            search_query = f"{first_track['title']} {first_track.get('artist', '')}"
-            source = await YTDLSource.create_source(search_query, loop=self.bot.loop)
-            source.requester = ctx.author
-            await self.play_song(ctx, source)
+    def skip(self, voice_client):
+        """Stop the current track so the next one plays, even in single-track repeat."""
+        self._skipping = True
+        voice_client.stop()
 
     async def play_next(self, ctx, error=None):
         """Play the next song in queue."""
         if error:
             await ctx.send(f"❌ Error: {str(error)}")
 
+        # Reuse the track the engine already opened, if it is still up next
+        engine, self._engine = self._engine, None
+        preloaded = engine.take_next() if engine else None
+        self._preload_entry = None
+        skipping, self._skipping = self._skipping, False
+        # Only a track that was actually playing goes around again
+        finished = self.state is not PlayerState.IDLE
+        self.set_state(PlayerState.TRANSITIONING)
+        queue = None
+
         try:
-            queue = self.bot.music_queues[ctx.guild.id]
-            if not queue.queue:
-                if queue.loop and self._current:
-                    queue.queue.append(self._current)
-                else:
-                    return
+            queue = self.bot.music_queues[self.guild_id]
+            next_track = self._peek_next(queue, skipping)
+            if next_track is None or not ctx.voice_client:
+                self.set_state(PlayerState.IDLE)
+                return
 
             # Get next track
-            next_track = queue.queue.popleft()
+            if finished:
+                self._requeue_finished(queue, next_track)
+            if queue.queue and queue.queue[0] is next_track:
+                queue.pop_left()
             self._current = next_track
 
             # Create source
-            if isinstance(next_track, dict):
-                # Spotify track
-                search_query = f"{next_track['title']} {next_track.get('artist', '')}"
-                source = await YTDLSource.create_source(search_query, loop=self.bot.loop)
-                source.requester = next_track['requester']
-                # Store additional metadata
-                source.title = next_track['title']
-                source.artist = next_track.get('artist', '')
-                source.duration = next_track.get('duration', 0)
+            audio = None
+            if preloaded and preloaded[0] is next_track:
+                _, source, audio = preloaded
+                preloaded = None
+            elif isinstance(next_track, dict):
+                # Spotify track, usually already resolved in the background
+                prefetcher = self.get_prefetcher()
+                self.set_state(PlayerState.RESOLVING)
+                with metrics.timer('track_resolve_seconds', guild=self.guild_id, stage='play'):
+                    source = await prefetcher.take(next_track)
+                    if source is None:
+                        source = await YTDLSource.from_spotify_track(next_track, loop=self.bot.loop)
             else:
                 # YouTube track
                 source = next_track
 
+            # Start resolving the tracks after this one
+            self.queue_changed()
+
             # Play the track
-            await self.play_song(ctx, source)
+            await self.play_song(ctx, source, audio=audio)
 
         except Exception as e:
             logging.error(f"Error in play_next: {e}")
             await ctx.send("❌ Error playing next song")
+            # A track that failed to start isn't repeated
+            self._current_source = None
+            self._replay = None
             # Try next song
             if queue and queue.queue:
                 await self.play_next(ctx)
+            else:
+                self.set_state(PlayerState.IDLE)
+        finally:
+            if preloaded:
+                preloaded[2].cleanup()
 
-    async def play_song(self, ctx, source):
-        """Play a song and show now playing."""
+    def _replay_entry(self):
+        """Get the queue entry that plays the current track again, built once per track."""
+        source = self._current_source
+        if self._replay is None and hasattr(source, 'replay_entry'):
+            self._replay = source.replay_entry()
+        return self._replay
+
+    def _peek_next(self, queue, skipping=False):
+        """Get the entry that will play after the current track, without taking it.
+
+        Replays of the current track aren't queued ahead of time, so changing
+        the loop mode takes effect on the next transition.
+        """
+        replay = None
+        if queue.loop == LoopMode.TRACK and not skipping:
+            replay = self._replay_entry()
+        if replay is None and queue.queue:
+            return queue.queue[0]
+        if replay is None and queue.loop == LoopMode.QUEUE:
+            replay = self._replay_entry()
+        return replay
+
+    def _requeue_finished(self, queue, next_entry):
+        """In queue loop mode, send the track that just ended to the back of the queue."""
+        if queue.loop != LoopMode.QUEUE:
+            return
+        replay = self._replay_entry()
+        if replay is not None and replay is not next_entry:
+            queue.append(replay)
+
+    async def preload_next(self, ctx, engine, generation):
+        """Open the next track's audio before the current one ends."""
         try:
-            # Stop current view if exists
-            if hasattr(self.bot, 'current_np_view') and self.bot.current_np_view:
-                self.bot.current_np_view.stop()
+            queue = self.bot.music_queues.get(self.guild_id)
+            entry = self._peek_next(queue) if queue else None
+            self._preload_entry = entry
+            if entry is None:
+                engine.set_no_next(generation)
+                return
+
+            if isinstance(entry, dict):
+                with metrics.timer('track_resolve_seconds', guild=self.guild_id, stage='preload'):
+                    source = await self.get_prefetcher().get(entry)
+                    if source is None:
+                        source = await YTDLSource.from_spotify_track(entry, loop=self.bot.loop)
+            else:
+                source = entry
+
+            engine.set_next(entry, source, source.create_audio(self.get_filters()), generation)
+
+        except Exception as e:
+            logging.error(f"Error preloading next track: {e}")
+            engine.set_no_next(generation)
+
+    def _on_track_start(self, ctx, entry, source):
+        """Called when the engine switches to a preloaded track."""
+        self.set_state(PlayerState.TRANSITIONING)
+        queue = self.bot.music_queues.get(self.guild_id)
+        if queue:
+            self._requeue_finished(queue, entry)
+            if queue.queue and queue.queue[0] is entry:
+                queue.pop_left()
+            else:
+                queue.remove(entry)
+
+        self._preload_entry = None
+        self._store_track_info(source)
+        self._record_play(source)
+        self.queue_changed()
+        self.set_state(PlayerState.PLAYING)
+        self._show_now_playing(ctx)
+
+    def _show_now_playing(self, ctx):
+        """Replace the now playing view with one for the current track."""
+        # Stop current view if exists
+        if self.np_view:
+            self.np_view.stop()
+
+        if self._current:
+            from views.now_playing_view import NowPlayingView
+            view = NowPlayingView(ctx, self.bot, self._current, self)
+            self.bot.loop.create_task(view.start())
 
+    async def play_song(self, ctx, source, audio=None):
+        """Play a song and show now playing."""
+        try:
             # Store track info before creating audio source
             self._store_track_info(source)
+            self._record_play(source)
             self._position = 0
 
-            # Create audio source with time tracking
-            audio = discord.PCMVolumeTransformer(
-                discord.FFmpegPCMAudio(source.stream_url, **FFMPEG_OPTIONS)
-            )
-            
-            # Add tracking info
-            audio.start_time = time.time()
-            audio.original = source
-            
             # Play the song
             if ctx.voice_client:
+                engine = PlaybackEngine(
+                    self.bot.loop,
+                    source,
+                    audio or source.create_audio(self.get_filters()),
+                    on_preload=lambda generation: self.bot.loop.create_task(
+                        self.preload_next(ctx, engine, generation)
+                    ),
+                    on_track_start=lambda entry, new_source: self._on_track_start(ctx, entry, new_source),
+                    gaps=self.transition_gaps,
+                    guild_id=self.guild_id
+                )
+                self._engine = engine
                 ctx.voice_client.play(
-                    audio, 
-                    after=lambda e: self.bot.loop.create_task(self.play_next(ctx, e))
+                    engine,
+                    after=lambda e: asyncio.run_coroutine_threadsafe(self.play_next(ctx, e), self.bot.loop)
                 )
+                self.set_state(PlayerState.PLAYING)
 
                 # Show now playing view
-                if self._current:
-                    from views.now_playing_view import NowPlayingView
-                    view = NowPlayingView(ctx, self.bot, self._current)
-                    self.bot.current_np_view = view
-                    await view.start()
+                self._show_now_playing(ctx)
+            else:
+                if audio:
+                    audio.cleanup()
+                self.set_state(PlayerState.IDLE)
 
         except Exception as e:
             logging.error(f"Error in play_song: {e}")
+            self.set_state(PlayerState.IDLE)
             await ctx.send("❌ Error playing song")
 
+    def pause(self, voice_client):
+        """Pause playback."""
+        voice_client.pause()
+        self.set_state(PlayerState.PAUSED)
+
+    def resume(self, voice_client):
+        """Resume paused playback."""
+        voice_client.resume()
+        self.set_state(PlayerState.PLAYING)
+
+    def shutdown(self):
+        """Release background work and the now playing view."""
+        if self.np_view:
+            self.np_view.stop()
+        if self._prefetcher:
+            self._prefetcher.clear()
+        if self._engine:
+            self._engine.invalidate_next()
+            self._engine = None
+        self.state = PlayerState.IDLE
+
+    def get_filters(self):
+        """Get the guild's volume, EQ and normalization settings."""
+        queue = self.bot.music_queues.get(self.guild_id)
+        return queue.filters if queue else AudioFilters()
+
+    def filters_changed(self):
+        """Switch streams sent as Opus passthrough to PCM once a filter needs decoded audio.
+
+        PCM streams pick up the change on their next frame; Opus packets
+        can't be filtered, so those are reopened at the same position.
+        """
+        engine = self._engine
+        if not engine or self.get_filters().is_neutral():
+            return
+        if engine.next_is_opus():
+            self._preload_entry = None
+            engine.invalidate_next()
+        if engine.is_opus():
+            self.seek(self.get_position())
+
+    def get_stream_stats(self):
+        """Get the current stream's encoding mode and voice thread CPU usage."""
+        if not self._engine:
+            return None
+        return {
+            'passthrough': self._engine.is_opus(),
+            'cpu_percent': self._engine.cpu_percent()
+        }
+
+    def get_transition_stats(self):
+        """Get inter-track gap statistics in milliseconds."""
+        gaps = list(self.transition_gaps)
+        if not gaps:
+            return None
+        return {
+            'count': len(gaps),
+            'last': gaps[-1],
+            'avg': sum(gaps) / len(gaps),
+            'max': max(gaps)
+        }
+
+    def get_position(self):
+        """Get how far into the current track playback is, in seconds."""
+        return self._engine.position() if self._engine else 0
+
+    def seek(self, position):
+        """Jump to a position in the current track.
+
+        Reopens FFmpeg on the already resolved stream with an input-side seek.
+        Returns the new position, or None if nothing is playing.
+        """
+        engine = self._engine
+        source = engine.source if engine else None
+        if source is None or not hasattr(source, 'create_audio'):
+            return None
+
+        duration = source.duration or 0
+        position = max(0.0, min(position, duration - 1) if duration else position)
+        source.seek_seconds = position
+        engine.seek(source.create_audio(self.get_filters()), position)
+        self._position = position
+        self.last_active = time.monotonic()
+        return position
+
     def get_current_source(self):
         """Get current source."""
         return self._current_source
\ No newline at end of file
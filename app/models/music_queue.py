@@ -1,37 +1,218 @@
-from collections import deque
+import random
+from enum import IntEnum
+from models.indexed_queue import IndexedQueue
+from models.audio_filters import AudioFilters
+
+
+class LoopMode(IntEnum):
+    """What plays again once the queue moves on. Stored as its int value."""
+    OFF = 0
+    QUEUE = 1
+    TRACK = 2
+
+
+def get_requester(entry):
+    """Get who requested a queue entry."""
+    if isinstance(entry, dict):
+        return entry.get('requester')
+    return getattr(entry, 'requester', None)
+
+
+def get_duration(entry):
+    """Get a queue entry's duration in seconds."""
+    if isinstance(entry, dict):
+        return entry.get('duration') or 0
+    return getattr(entry, 'duration', 0) or 0
+
+
+def requester_key(requester):
+    """Key requesters by id so member objects from different events match."""
+    return getattr(requester, 'id', requester)
+
 
 class MusicQueue:
-    """Handles the music queue for a guild."""
+    """Handles the music queue for a guild.
+
+    Every mutation goes through the methods below so the running totals
+    (total duration and per-requester counts, durations and entries) stay
+    in sync without walking the queue.
+    """
     def __init__(self):
-        self.queue = deque()
+        self.queue = IndexedQueue()
         self.current = None
-        self.loop = False
-        self.volume = 1.0
+        self.loop = LoopMode.OFF
+        self.filters = AudioFilters()
         self.processing = True
         self.pending_tracks = []
         self.shuffle_count = 0
         self.track_info = {}
+        self.total_duration = 0
+        # Bumped on every change to the entries, so savers can tell when to write
+        self.version = 0
+        # requester key -> {'requester', 'tracks', 'duration', 'entries': {id(entry): entry}}
+        self._requesters = {}
+        # id(entry) -> [entry, requester key, duration, copies in queue]
+        self._members = {}
+
+    @property
+    def volume(self):
+        return self.filters.volume
+
+    @volume.setter
+    def volume(self, value):
+        self.filters.volume = value
+
+    def _track_added(self, entry):
+        """Add an entry to the running totals."""
+        member = self._members.get(id(entry))
+        if member:
+            key, duration = member[1], member[2]
+            member[3] += 1
+        else:
+            requester = get_requester(entry)
+            key, duration = requester_key(requester), get_duration(entry)
+            self._members[id(entry)] = [entry, key, duration, 1]
+
+            stats = self._requesters.get(key)
+            if stats is None:
+                stats = self._requesters[key] = {
+                    'requester': requester, 'tracks': 0, 'duration': 0, 'entries': {}
+                }
+            stats['entries'][id(entry)] = entry
+
+        self.version += 1
+        stats = self._requesters[key]
+        stats['tracks'] += 1
+        stats['duration'] += duration
+        self.total_duration += duration
+
+    def _track_removed(self, entry):
+        """Remove an entry from the running totals."""
+        member = self._members.get(id(entry))
+        if not member:
+            return
+        _, key, duration, _ = member
+        self.version += 1
+        member[3] -= 1
+        if member[3] == 0:
+            del self._members[id(entry)]
+            self._requesters[key]['entries'].pop(id(entry), None)
+
+        stats = self._requesters[key]
+        stats['tracks'] -= 1
+        stats['duration'] -= duration
+        if stats['tracks'] == 0:
+            del self._requesters[key]
+        self.total_duration -= duration
+
+    def _reset_totals(self):
+        self.version += 1
+        self.total_duration = 0
+        self._requesters.clear()
+        self._members.clear()
 
     def add_track(self, track):
         """Add a track to the queue."""
-        self.queue.append(track)
+        self.append(track)
+
+    def append(self, entry):
+        """Add an entry to the end of the queue."""
+        self.queue.append(entry)
+        self._track_added(entry)
+
+    def appendleft(self, entry):
+        """Add an entry to the front of the queue."""
+        self.queue.appendleft(entry)
+        self._track_added(entry)
+
+    def extend(self, entries):
+        """Add entries to the end of the queue."""
+        for entry in entries:
+            self.append(entry)
 
     def pop_left(self):
         """Remove and return the leftmost item."""
-        return self.queue.popleft() if self.queue else None
-        
+        if not self.queue:
+            return None
+        entry = self.queue.popleft()
+        self._track_removed(entry)
+        return entry
+
     def pop_at(self, index):
         """Remove and return item at index."""
         if not self.queue or index >= len(self.queue):
             return None
-        temp_list = list(self.queue)
-        item = temp_list.pop(index)
-        self.queue = deque(temp_list)
+        item = self.queue.pop(index)
+        self._track_removed(item)
         return item
 
+    def remove(self, entry):
+        """Remove an entry by identity. Returns True if it was queued."""
+        if id(entry) not in self._members:
+            return False
+        try:
+            self.queue.remove(entry)
+        except ValueError:
+            return False
+        self._track_removed(entry)
+        return True
+
+    def remove_requester(self, requester):
+        """Remove every entry requested by a user and return how many were removed."""
+        stats = self._requesters.get(requester_key(requester))
+        if not stats:
+            return 0
+        removed = set(stats['entries'])
+        count = stats['tracks']
+        self.queue.retain(lambda entry: id(entry) not in removed)
+        for entry_id in removed:
+            del self._members[entry_id]
+        self.total_duration -= stats['duration']
+        del self._requesters[requester_key(requester)]
+        self.version += 1
+        return count
+
+    def shuffle(self):
+        """Shuffle each requester's tracks and interleave them fairly."""
+        tracks_by_user = [list(self._entries_of(key)) for key in self._requesters]
+        for tracks in tracks_by_user:
+            random.shuffle(tracks)
+
+        shuffled_tracks = []
+        max_tracks = max((len(tracks) for tracks in tracks_by_user), default=0)
+        for i in range(max_tracks):
+            for tracks in tracks_by_user:
+                if i < len(tracks):
+                    shuffled_tracks.append(tracks[i])
+
+        # Same entries in a new order, so the totals are unchanged
+        self.queue = IndexedQueue(shuffled_tracks)
+        self.shuffle_count += 1
+        self.version += 1
+        return len(shuffled_tracks)
+
+    def _entries_of(self, key):
+        """Yield a requester's entries, repeated for duplicates."""
+        for entry_id, entry in self._requesters[key]['entries'].items():
+            for _ in range(self._members[entry_id][3]):
+                yield entry
+
+    def count_by(self, requester):
+        """Get how many entries a user has in the queue."""
+        stats = self._requesters.get(requester_key(requester))
+        return stats['tracks'] if stats else 0
+
+    def requester_stats(self):
+        """Get (requester, track count, total duration) for everyone with queued tracks."""
+        return [
+            (stats['requester'], stats['tracks'], stats['duration'])
+            for stats in self._requesters.values()
+        ]
+
     def clear(self):
         """Clear the queue."""
         self.queue.clear()
+        self._reset_totals()
 
     def get_length(self):
         """Get queue length."""
@@ -0,0 +1,147 @@
+import os
+import logging
+import numpy as np
+import discord
+from models.audio_filters import EQ_PRESETS
+
+logger = logging.getLogger('PCMFilter')
+
+# Loudness every track is brought to when normalization is on, in dBFS RMS
+NORMALIZE_TARGET_DB = float(os.getenv('NORMALIZE_TARGET_DB', '-16'))
+MAX_BOOST_DB = 10.0
+MAX_CUT_DB = -20.0
+# Analysis of an unmeasured track starts steering the gain after this much audio
+MIN_ANALYSIS_SECONDS = 5
+# and is only cached once it covers this much
+STORE_ANALYSIS_SECONDS = 30
+# Quieter frames are left out of the loudness measurement
+SILENCE_DB = -60.0
+
+SAMPLE_RATE = discord.opus.Encoder.SAMPLING_RATE
+CHANNELS = discord.opus.Encoder.CHANNELS
+FRAME_SIZE = discord.opus.Encoder.FRAME_SIZE
+FRAME_SAMPLES = discord.opus.Encoder.SAMPLES_PER_FRAME
+FRAME_MS = discord.opus.Encoder.FRAME_LENGTH
+FULL_SCALE = 32768.0
+
+# Gain moves across one frame along this ramp so changes don't click
+RAMP = np.linspace(0.0, 1.0, FRAME_SAMPLES, endpoint=False, dtype=np.float32)[:, None]
+
+# Shelving EQ as a single linear-phase FIR, applied with FFT overlap-save
+EQ_TAPS = 255
+EQ_FFT_SIZE = 2048
+LOW_SHELF_HZ = 250
+HIGH_SHELF_HZ = 4000
+
+
+def _lowpass(cutoff):
+    """Windowed-sinc low-pass kernel with unity gain at DC."""
+    n = np.arange(EQ_TAPS) - (EQ_TAPS - 1) / 2
+    kernel = np.sinc(2 * cutoff / SAMPLE_RATE * n) * np.hamming(EQ_TAPS)
+    return kernel / kernel.sum()
+
+
+def _eq_kernel(low_db, high_db):
+    """Combine a low shelf and a high shelf into one kernel."""
+    impulse = np.zeros(EQ_TAPS)
+    impulse[(EQ_TAPS - 1) // 2] = 1.0
+    low = _lowpass(LOW_SHELF_HZ)
+    high = impulse - _lowpass(HIGH_SHELF_HZ)
+    return impulse + (10 ** (low_db / 20) - 1) * low + (10 ** (high_db / 20) - 1) * high
+
+
+class Equalizer:
+    """Streaming FIR filter over stereo frames, keeping the tail of the previous frame."""
+    _spectra = {}  # preset -> kernel spectrum, shared by every stream
+
+    def __init__(self, preset):
+        spectrum = self._spectra.get(preset)
+        if spectrum is None:
+            spectrum = np.fft.rfft(_eq_kernel(*EQ_PRESETS[preset]), EQ_FFT_SIZE)[:, None]
+            self._spectra[preset] = spectrum
+        self.preset = preset
+        self.spectrum = spectrum
+        self.history = np.zeros((EQ_TAPS - 1, CHANNELS), dtype=np.float32)
+
+    def process(self, samples):
+        block = np.concatenate((self.history, samples))
+        self.history = block[-(EQ_TAPS - 1):]
+        filtered = np.fft.irfft(np.fft.rfft(block, EQ_FFT_SIZE, axis=0) * self.spectrum, EQ_FFT_SIZE, axis=0)
+        return filtered[EQ_TAPS - 1:EQ_TAPS - 1 + len(samples)].astype(np.float32)
+
+
+class FilteredAudio(discord.AudioSource):
+    """PCM stage applying a guild's volume, EQ and loudness normalization.
+
+    Works on the 20 ms frames FFmpeg produces, so a settings change is heard
+    on the next frame without touching FFmpeg. A track without a known
+    loudness is measured while it plays and the result is reported through
+    on_measured once enough of it was heard.
+    """
+    def __init__(self, original, filters, loudness=None, on_measured=None):
+        self.original = original
+        self.filters = filters
+        self.loudness = loudness
+        self.on_measured = on_measured
+        self._gain = 1.0
+        self._equalizer = None
+        self._power = 0.0   # sum of mean squares of measured frames
+        self._measured = 0  # frames measured
+
+    def is_opus(self):
+        return False
+
+    def _normalize_db(self, samples):
+        """Get the normalization gain in dB, measuring the frame if the track is unknown."""
+        if self.loudness is None:
+            power = float(np.mean(samples * samples)) / (FULL_SCALE * FULL_SCALE)
+            if power > 10 ** (SILENCE_DB / 10):
+                self._power += power
+                self._measured += 1
+            if self._measured * FRAME_MS < MIN_ANALYSIS_SECONDS * 1000:
+                return 0.0
+            loudness = 10 * np.log10(self._power / self._measured)
+        else:
+            loudness = self.loudness
+        return min(MAX_BOOST_DB, max(MAX_CUT_DB, NORMALIZE_TARGET_DB - loudness))
+
+    def read(self):
+        data = self.original.read()
+        if len(data) != FRAME_SIZE:
+            return data
+
+        filters = self.filters
+        normalize = filters.normalize
+        eq = filters.eq if filters.eq in EQ_PRESETS else 'flat'
+        if filters.volume == 1.0 and self._gain == 1.0 and eq == 'flat' and not normalize:
+            self._equalizer = None
+            return data
+
+        samples = np.frombuffer(data, dtype=np.int16).astype(np.float32).reshape(-1, CHANNELS)
+        gain = filters.volume
+        if normalize:
+            gain *= 10 ** (self._normalize_db(samples) / 20)
+
+        if eq == 'flat':
+            self._equalizer = None
+        else:
+            if self._equalizer is None or self._equalizer.preset != eq:
+                self._equalizer = Equalizer(eq)
+            samples = self._equalizer.process(samples)
+
+        if gain != self._gain:
+            samples *= self._gain + (gain - self._gain) * RAMP
+            self._gain = gain
+        elif gain != 1.0:
+            samples *= gain
+        return np.clip(samples, -FULL_SCALE, FULL_SCALE - 1).astype(np.int16).tobytes()
+
+    def cleanup(self):
+        if (self.loudness is None and self.on_measured
+                and self._measured * FRAME_MS >= STORE_ANALYSIS_SECONDS * 1000):
+            loudness = 10 * np.log10(self._power / self._measured)
+            try:
+                self.on_measured(float(loudness))
+            except Exception as e:
+                logger.error(f"Error storing loudness: {e}")
+        self.original.cleanup()
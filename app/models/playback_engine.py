@@ -0,0 +1,326 @@
+import os
+import time
+import audioop
+import logging
+import threading
+from collections import deque
+import discord
+from utils.metrics import metrics
+
+logger = logging.getLogger('PlaybackEngine')
+
+# Open the next track's FFmpeg process this many seconds before the current one ends
+PRELOAD_SECONDS = float(os.getenv('PRELOAD_SECONDS', '5'))
+# Overlap between tracks, 0 disables crossfading
+CROSSFADE_MS = int(os.getenv('CROSSFADE_MS', '0'))
+# How long to keep the connection fed with silence while a late track resolves
+NEXT_TRACK_TIMEOUT = float(os.getenv('NEXT_TRACK_TIMEOUT', '15'))
+
+FRAME_MS = discord.opus.Encoder.FRAME_LENGTH
+FRAME_SIZE = discord.opus.Encoder.FRAME_SIZE
+SILENCE = b'\x00' * FRAME_SIZE
+JITTER_CUTOFF = 1.0
+
+# States of the upcoming track
+NEXT_IDLE = 'idle'        # not requested yet
+NEXT_PENDING = 'pending'  # requested, the player is resolving it
+NEXT_READY = 'ready'      # audio opened and waiting
+NEXT_NONE = 'none'        # nothing left to play
+
+
+class PlaybackEngine(discord.AudioSource):
+    """Audio source that plays consecutive tracks through a single VoiceClient.play call.
+
+    The next track's audio is requested shortly before the current one ends
+    and swapped in between two 20 ms frames, optionally mixing the tail of
+    one track with the head of the next for a crossfade. Tracks opened as
+    Opus passthrough are forwarded without encoding; is_opus reports the
+    kind of the frame last returned by read.
+    """
+    def __init__(self, loop, source, audio, *, on_preload, on_track_start,
+                 crossfade_ms=CROSSFADE_MS, preload_seconds=PRELOAD_SECONDS, gaps=None, guild_id=None):
+        self.loop = loop
+        self.guild_id = guild_id
+        self.on_preload = on_preload
+        self.on_track_start = on_track_start
+        self.fade_frames = max(0, int(crossfade_ms) // FRAME_MS)
+        self.preload_frames = int(max(preload_seconds, self.fade_frames * FRAME_MS / 1000 + 1) * 1000 / FRAME_MS)
+        self.gaps = gaps if gaps is not None else deque(maxlen=100)
+
+        self.source = source
+        self.audio = audio
+        self.frames = 0
+        self.duration_frames = self._duration_frames(source)
+        self.start_time = time.time()
+
+        self._lock = threading.Lock()
+        self._next = None
+        self._next_state = NEXT_IDLE
+        self._generation = 0
+        self._fading = None
+        self._waiting_since = None
+        self._last_frame_at = None
+        self._opus = False
+        self._seek = None  # (audio reopened at a new position, that position), swapped in by the voice thread
+
+        # Voice thread CPU time, covering read, encode and send of each frame
+        self.cpu_seconds = 0.0
+        self.cpu_frames = 0
+        self._cpu_mark = None
+        self._read_at = None
+
+    @property
+    def original(self):
+        """The metadata source of the track currently playing."""
+        return self.source
+
+    def is_opus(self):
+        return self._opus
+
+    def cpu_percent(self):
+        """Get the voice thread CPU used by this stream as a percentage of one core."""
+        if not self.cpu_frames:
+            return 0.0
+        return self.cpu_seconds / (self.cpu_frames * FRAME_MS / 1000) * 100
+
+    def _duration_frames(self, source):
+        """Get the expected track length in frames from the extracted duration."""
+        data = getattr(source, 'data', None) or {}
+        duration = data.get('duration') or getattr(source, 'duration', 0) or 0
+        # Frames are counted from the seek position, and skipped SponsorBlock
+        # segments are never read, so the track ends that much sooner
+        duration -= getattr(source, 'seek_seconds', 0) + getattr(source, 'skipped_seconds', 0)
+        return int(max(0, duration) * 1000 / FRAME_MS)
+
+    def set_next(self, entry, source, audio, generation):
+        """Hand over the next track's opened audio. Called from the event loop."""
+        with self._lock:
+            if generation == self._generation and self._next_state == NEXT_PENDING:
+                self._next = (entry, source, audio)
+                self._next_state = NEXT_READY
+                return
+        # Stale request, the queue changed while it was resolving
+        audio.cleanup()
+
+    def set_no_next(self, generation):
+        """Mark that nothing follows the current track."""
+        with self._lock:
+            if generation == self._generation and self._next_state == NEXT_PENDING:
+                self._next_state = NEXT_NONE
+
+    def invalidate_next(self):
+        """Drop the upcoming track so it is requested again."""
+        with self._lock:
+            pending = self._next
+            self._next = None
+            self._next_state = NEXT_IDLE
+            self._generation += 1
+        if pending:
+            pending[2].cleanup()
+
+    def seek(self, audio, position):
+        """Replace the current track's audio with one reopened at a new position.
+
+        Called from the event loop after setting the source's seek_seconds; the
+        voice thread swaps it in before its next read, which may be much later
+        while paused. Until then position() reports the new position.
+        """
+        with self._lock:
+            stale, self._seek = self._seek, (audio, position)
+        if stale:
+            stale[0].cleanup()
+
+    def _apply_seek(self):
+        with self._lock:
+            pending, self._seek = self._seek, None
+            old = self.audio
+            if old is not None:
+                # Swapped together with the frame count so position() never mixes the two
+                self.audio = pending[0]
+                self.frames = 0
+        if old is None:
+            # The track ran out before the seek arrived
+            pending[0].cleanup()
+            return
+        if self._fading is not None:
+            self._fading[0].cleanup()
+            self._fading = None
+        old.cleanup()
+        self.duration_frames = self._duration_frames(self.source)
+
+    def position(self):
+        """Get the position in the current track in seconds, from the frames sent."""
+        with self._lock:
+            if self._seek is not None:
+                return self._seek[1]
+            audio, frames = self.audio, self.frames
+        while audio is not None:
+            # The segment skipper also counts the skipped parts
+            if hasattr(audio, 'position'):
+                return audio.position
+            audio = getattr(audio, 'original', None)
+        return getattr(self.source, 'seek_seconds', 0) + frames * FRAME_MS / 1000
+
+    def next_is_opus(self):
+        """Check if the preloaded track was opened as Opus passthrough."""
+        pending = self._next
+        return bool(pending and pending[2].is_opus())
+
+    def take_next(self):
+        """Detach the preloaded track so the player can reuse it after a stop."""
+        with self._lock:
+            pending = self._next
+            self._next = None
+            self._next_state = NEXT_NONE
+            self._generation += 1
+        return pending
+
+    def _request_next(self):
+        """Ask the player to open the next track."""
+        with self._lock:
+            if self._next_state != NEXT_IDLE:
+                return
+            self._next_state = NEXT_PENDING
+            generation = self._generation
+        self.loop.call_soon_threadsafe(self.on_preload, generation)
+
+    def _switch(self, pending):
+        """Make the preloaded track current."""
+        entry, source, audio = pending
+        self.source = source
+        self.audio = audio
+        self.frames = 0
+        self.duration_frames = self._duration_frames(source)
+        self.start_time = time.time()
+        self._waiting_since = None
+        with self._lock:
+            if self._next_state == NEXT_READY:
+                self._next_state = NEXT_IDLE
+        self.loop.call_soon_threadsafe(self.on_track_start, entry, source)
+
+    def _check_upcoming(self):
+        """Request the next track and start crossfading near the end of the current one."""
+        if self.duration_frames <= 0:
+            return
+
+        frames_left = self.duration_frames - self.frames
+        if frames_left <= self.preload_frames:
+            self._request_next()
+
+        if self.fade_frames and self._fading is None and frames_left <= self.fade_frames:
+            with self._lock:
+                pending = self._next
+                # Opus packets can't be mixed, those tracks switch without a fade
+                if pending and (pending[2].is_opus() or self.audio.is_opus()):
+                    pending = None
+                else:
+                    self._next = None
+            if pending:
+                self._fading = [self.audio, 0]
+                self._switch(pending)
+                self.gaps.append(0.0)
+
+    def _mix_fade(self, data):
+        """Mix the outgoing track into the incoming frame with a linear ramp."""
+        outgoing, done = self._fading
+        old = outgoing.read() if done < self.fade_frames else b''
+        if not old:
+            outgoing.cleanup()
+            self._fading = None
+            return data
+
+        self._fading[1] = done + 1
+        gain = done / self.fade_frames
+        old = audioop.mul(old, 2, 1.0 - gain)
+        if not data:
+            return old
+        return audioop.add(old, audioop.mul(data, 2, gain), 2)
+
+    def _advance(self):
+        """Switch to the next track once the current one has run out."""
+        with self._lock:
+            pending = self._next
+            self._next = None
+            state = self._next_state
+
+        if pending is None:
+            if state == NEXT_NONE:
+                return b''
+            self._request_next()
+
+            # Keep the voice connection fed while the next track resolves
+            now = time.perf_counter()
+            if self._waiting_since is None:
+                self._waiting_since = now
+            if now - self._waiting_since > NEXT_TRACK_TIMEOUT:
+                return b''
+            return SILENCE
+
+        self._switch(pending)
+        data = self.audio.read()
+        if not data:
+            self.audio.cleanup()
+            self.audio = None
+            return SILENCE
+        self._opus = self.audio.is_opus()
+
+        if self._last_frame_at is not None:
+            gap = max(0.0, (time.perf_counter() - self._last_frame_at) * 1000 - FRAME_MS)
+            self.gaps.append(gap)
+            metrics.observe('track_transition_gap_seconds', gap / 1000, guild=self.guild_id)
+            logger.info(f"Track transition gap: {gap:.1f} ms")
+        self._mark_frame()
+        return data
+
+    def _mark_frame(self):
+        self.frames += 1
+        self._last_frame_at = time.perf_counter()
+
+    def _measure(self):
+        """Account voice thread CPU and frame timing since the previous read."""
+        now = time.thread_time()
+        if self._cpu_mark is not None:
+            self.cpu_seconds += now - self._cpu_mark
+            self.cpu_frames += 1
+        self._cpu_mark = now
+
+        read_at = time.perf_counter()
+        if self._read_at is not None:
+            interval = read_at - self._read_at
+            # Longer pauses are the player being paused, not jitter
+            if interval < JITTER_CUTOFF:
+                metrics.observe('voice_frame_jitter_seconds', abs(interval - FRAME_MS / 1000), guild=self.guild_id)
+        self._read_at = read_at
+
+    def read(self):
+        self._measure()
+        if self._seek is not None:
+            self._apply_seek()
+        if self.audio is not None:
+            self._check_upcoming()
+            data = self.audio.read()
+            self._opus = self.audio.is_opus()
+            if self._fading is not None:
+                data = self._mix_fade(data)
+            if data:
+                self._mark_frame()
+                return data
+            self.audio.cleanup()
+            self.audio = None
+        self._opus = False
+        return self._advance()
+
+    def cleanup(self):
+        """Close the current audio. A preloaded track is left for take_next."""
+        if self.cpu_frames:
+            logger.info(f"Stream used {self.cpu_percent():.2f}% CPU over {self.cpu_frames} frames")
+        if self._fading is not None:
+            self._fading[0].cleanup()
+            self._fading = None
+        if self.audio is not None:
+            self.audio.cleanup()
+            self.audio = None
+        with self._lock:
+            pending_seek, self._seek = self._seek, None
+        if pending_seek:
+            pending_seek[0].cleanup()
@@ -0,0 +1,77 @@
+import os
+import time
+import asyncio
+import logging
+from models.music_player import MusicPlayer, PlayerState
+
+# Seconds a guild may sit idle before its player is dropped
+PLAYER_IDLE_TIMEOUT = int(os.getenv('PLAYER_IDLE_TIMEOUT', '900'))
+EVICT_INTERVAL = 60
+
+
+class PlayerRegistry:
+    """Guild-keyed registry of MusicPlayer instances."""
+    def __init__(self, bot, idle_timeout=PLAYER_IDLE_TIMEOUT):
+        self.bot = bot
+        self.idle_timeout = idle_timeout
+        self.players = {}
+        self._evict_task = None
+
+    def get(self, guild_id):
+        """Get the guild's player, creating it on first use."""
+        if guild_id not in self.players:
+            self.players[guild_id] = MusicPlayer(self.bot, guild_id)
+        player = self.players[guild_id]
+        player.last_active = time.monotonic()
+        return player
+
+    def peek(self, guild_id):
+        """Get the guild's player without creating one."""
+        return self.players.get(guild_id)
+
+    def __len__(self):
+        return len(self.players)
+
+    def values(self):
+        return list(self.players.values())
+
+    def start(self):
+        """Start evicting idle guilds in the background."""
+        if self._evict_task is None:
+            self._evict_task = self.bot.loop.create_task(self._evict_loop())
+
+    async def _evict_loop(self):
+        while True:
+            await asyncio.sleep(EVICT_INTERVAL)
+            try:
+                self.evict_idle()
+            except Exception as e:
+                logging.error(f"Error evicting idle players: {e}")
+
+    def evict_idle(self):
+        """Drop players, and their empty queues, of guilds that have been idle too long."""
+        now = time.monotonic()
+        evicted = 0
+        for guild_id, player in list(self.players.items()):
+            if player.state is not PlayerState.IDLE or now - player.last_active < self.idle_timeout:
+                continue
+
+            player.shutdown()
+            del self.players[guild_id]
+            queue = self.bot.music_queues.get(guild_id)
+            if queue is not None and not queue.queue:
+                del self.bot.music_queues[guild_id]
+            evicted += 1
+
+        if evicted:
+            logging.info(f"Evicted {evicted} idle players, {len(self.players)} active")
+        return evicted
+
+    def close(self):
+        """Shut down every player."""
+        if self._evict_task:
+            self._evict_task.cancel()
+            self._evict_task = None
+        for player in self.players.values():
+            player.shutdown()
+        self.players.clear()
@@ -0,0 +1,117 @@
+import os
+import asyncio
+import logging
+from itertools import islice
+from models.yt_source import YTDLSource
+from utils.extraction_cache import extraction_cache
+from utils.match_index import match_index
+from utils.extraction_scheduler import PRIORITY_PREFETCH
+from utils.sponsorblock import sponsorblock_handler
+
+PREFETCH_DEPTH = int(os.getenv('PREFETCH_DEPTH', '2'))
+PREFETCH_CONCURRENCY = int(os.getenv('PREFETCH_CONCURRENCY', '2'))
+# SponsorBlock lookups are cheap, so look further ahead for them
+SEGMENT_PREFETCH_DEPTH = int(os.getenv('SEGMENT_PREFETCH_DEPTH', '20'))
+
+
+class Prefetcher:
+    """Resolves the next queue entries for a guild in the background."""
+    def __init__(self, bot, queue, depth=PREFETCH_DEPTH, concurrency=PREFETCH_CONCURRENCY):
+        self.bot = bot
+        self.queue = queue
+        self.depth = depth
+        self._semaphore = asyncio.Semaphore(concurrency)
+        # id(entry) -> (entry, task); the entry is kept so its id stays unique
+        self._tasks = {}
+
+    def sync(self):
+        """Match background work to the current head of the queue.
+
+        Call after any queue change; work for entries that left the look-ahead
+        window is cancelled and entries that moved into it are started.
+        """
+        wanted = {
+            id(entry): entry
+            for entry in islice(self.queue.queue, self.depth)
+            if isinstance(entry, dict)
+        }
+
+        for key in list(self._tasks):
+            entry, task = self._tasks[key]
+            if wanted.get(key) is not entry:
+                del self._tasks[key]
+                self._discard(task)
+
+        for key, entry in wanted.items():
+            if key not in self._tasks:
+                task = self.bot.loop.create_task(self._resolve(entry))
+                self._tasks[key] = (entry, task)
+
+        sponsorblock_handler.prefetch(
+            self._video_id(entry) for entry in islice(self.queue.queue, SEGMENT_PREFETCH_DEPTH)
+        )
+
+    def _video_id(self, entry):
+        """Get an entry's YouTube video id if it is already known, from memory only."""
+        if isinstance(entry, dict):
+            if entry.get('webpage_url'):
+                url = entry['webpage_url']
+            else:
+                video_id = match_index.peek(entry)
+                if video_id:
+                    return video_id
+                data = extraction_cache.peek(YTDLSource.spotify_query(entry))
+                url = data.get('webpage_url') if data else None
+        else:
+            url = getattr(entry, 'url', None)
+        return sponsorblock_handler.extract_video_id(url) if url else None
+
+    async def take(self, entry):
+        """Get the prefetched source for an entry, waiting on in-flight work.
+
+        Returns None if the entry was never prefetched or resolution failed.
+        """
+        item = self._tasks.pop(id(entry), None)
+        if not item or item[0] is not entry:
+            return None
+
+        try:
+            return await item[1]
+        except asyncio.CancelledError:
+            return None
+        except Exception as e:
+            logging.error(f"Prefetch failed for {entry.get('title')}: {e}")
+            return None
+
+    async def get(self, entry):
+        """Wait for an entry's prefetched source without consuming it."""
+        item = self._tasks.get(id(entry))
+        if not item or item[0] is not entry:
+            return None
+
+        try:
+            return await asyncio.shield(item[1])
+        except asyncio.CancelledError:
+            return None
+        except Exception as e:
+            logging.error(f"Prefetch failed for {entry.get('title')}: {e}")
+            return None
+
+    def clear(self):
+        """Cancel all background work."""
+        for _, task in self._tasks.values():
+            self._discard(task)
+        self._tasks.clear()
+
+    async def _resolve(self, entry):
+        """Resolve a Spotify entry into a playable source."""
+        async with self._semaphore:
+            return await YTDLSource.from_spotify_track(entry, loop=self.bot.loop, priority=PRIORITY_PREFETCH)
+
+    def _discard(self, task):
+        """Cancel a task that is no longer needed."""
+        if not task.done():
+            task.cancel()
+        elif not task.cancelled():
+            # Mark a failure as retrieved so it isn't logged as unhandled
+            task.exception()
@@ -0,0 +1,267 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from models.music_queue import LoopMode, get_requester
+from models.music_player import PlayerState
+
+QUEUE_STORE_ENABLED = os.getenv('QUEUE_PERSISTENCE', '1') == '1'
+QUEUE_STORE_PATH = os.getenv('QUEUE_STORE_PATH', 'cache/queues.db')
+# Seconds between saves of changed queues and playback positions
+QUEUE_SAVE_INTERVAL = float(os.getenv('QUEUE_SAVE_INTERVAL', '10'))
+# Saved queues of guilds that never came back are dropped after this many days
+QUEUE_MAX_AGE_DAYS = int(os.getenv('QUEUE_MAX_AGE_DAYS', '7'))
+RESTORE_BATCH = 2000
+
+# Everything needed to show an entry and resolve it again later
+TRACK_FIELDS = ('title', 'artist', 'duration', 'thumbnail', 'webpage_url', 'position', 'spotify_id', 'isrc')
+
+
+class RestoredRequester:
+    """Stands in for a requester who isn't in the member cache after a restart."""
+    def __init__(self, user_id, name):
+        self.id = user_id
+        self.display_name = name
+        self.mention = f"<@{user_id}>"
+
+    def __str__(self):
+        return self.mention
+
+
+def describe(entry):
+    """Turn a queue entry into a small JSON-safe dict.
+
+    YouTube sources are saved by URL, so both kinds come back as dict
+    entries that resolve through the extraction cache when they play.
+    """
+    if isinstance(entry, dict):
+        track = {field: entry[field] for field in TRACK_FIELDS if entry.get(field) is not None}
+    else:
+        track = {
+            field: value for field, value in entry.replay_entry().items()
+            if field in TRACK_FIELDS and value is not None
+        }
+    requester = get_requester(entry)
+    if hasattr(requester, 'id'):
+        track['requester'] = [requester.id, getattr(requester, 'display_name', str(requester))]
+    return track
+
+
+def restore_entry(track, guild, requesters):
+    """Turn a saved dict back into a queue entry, sharing requesters through a dict by id."""
+    requester = track.pop('requester', None)
+    if requester:
+        user_id, name = requester
+        if user_id not in requesters:
+            requesters[user_id] = guild.get_member(user_id) or RestoredRequester(user_id, name)
+        track['requester'] = requesters[user_id]
+    return track
+
+
+class QueueStore:
+    """SQLite copy of every guild's queue, current track and position.
+
+    Saves happen in the background every QUEUE_SAVE_INTERVAL seconds: a queue
+    is only rewritten when its version changed, the small playback row of a
+    playing guild every time. Queues are read back one guild at a time on
+    that guild's next command, nothing is resolved until it plays.
+    """
+    def __init__(self, path=QUEUE_STORE_PATH, enabled=QUEUE_STORE_ENABLED):
+        self.path = path
+        self.enabled = enabled
+        self._db = None
+        self._lock = threading.Lock()
+        # One writer thread keeps saves in order
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='queue-store')
+        self._saved = {}  # guild id -> queue version last written
+        self._task = None
+        self.saves = 0
+        self.restores = 0
+
+    def _connect(self):
+        """Open the store and drop abandoned queues on first use."""
+        if self._db is not None:
+            return self._db
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS queues ('
+                'guild_id INTEGER PRIMARY KEY, tracks TEXT NOT NULL, updated REAL NOT NULL)'
+            )
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS playback ('
+                'guild_id INTEGER PRIMARY KEY, current TEXT, position REAL NOT NULL, '
+                'loop INTEGER NOT NULL, volume REAL NOT NULL, updated REAL NOT NULL)'
+            )
+            cutoff = time.time() - QUEUE_MAX_AGE_DAYS * 86400
+            db.execute(
+                'DELETE FROM queues WHERE updated < ? AND guild_id NOT IN '
+                '(SELECT guild_id FROM playback WHERE updated >= ?)', (cutoff, cutoff)
+            )
+            db.execute('DELETE FROM playback WHERE updated < ?', (cutoff,))
+            db.commit()
+            self._db = db
+        except Exception as e:
+            logging.error(f"Failed to open queue store at {self.path}: {e}")
+            self._db = False
+        return self._db
+
+    def start(self, bot):
+        """Start saving the bot's queues in the background."""
+        if self.enabled and self._task is None:
+            self._task = bot.loop.create_task(self._save_loop(bot))
+
+    async def _save_loop(self, bot):
+        while True:
+            await asyncio.sleep(QUEUE_SAVE_INTERVAL)
+            try:
+                await self.save(bot)
+            except Exception as e:
+                logging.error(f"Error saving queues: {e}")
+
+    def _snapshot(self, bot, guild_id, queue):
+        """Capture what needs saving for a guild. Runs on the event loop."""
+        entries = None
+        if self._saved.get(guild_id) != queue.version:
+            # Copying references is cheap, describing them happens in the writer thread
+            entries = list(queue.queue)
+            self._saved[guild_id] = queue.version
+
+        player = bot.players.peek(guild_id)
+        source = player.get_current_source() if player and player.state is not PlayerState.IDLE else None
+        return {
+            'entries': entries,
+            'current': source,
+            'position': player.get_position() if source else 0,
+            'loop': queue.loop,
+            'volume': queue.volume
+        }
+
+    async def save(self, bot):
+        """Write every changed queue and the playback state of active guilds."""
+        if not self.enabled:
+            return
+        snapshots = {
+            guild_id: self._snapshot(bot, guild_id, queue)
+            for guild_id, queue in bot.music_queues.items()
+        }
+        # Queues we wrote earlier whose guild has since let them go
+        dropped = [guild_id for guild_id in self._saved if guild_id not in bot.music_queues]
+        for guild_id in dropped:
+            del self._saved[guild_id]
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._write, snapshots, dropped)
+
+    def _write(self, snapshots, dropped):
+        """Serialize and store snapshots. Runs in the writer thread."""
+        with self._lock:
+            db = self._connect()
+            if not db:
+                return
+            now = time.time()
+            try:
+                for guild_id, snapshot in snapshots.items():
+                    if snapshot['entries'] is not None:
+                        if snapshot['entries']:
+                            # One JSON object per line, small calls let the event loop thread in between
+                            tracks = '\n'.join(
+                                json.dumps(describe(entry), separators=(',', ':')) for entry in snapshot['entries']
+                            )
+                            db.execute('INSERT OR REPLACE INTO queues VALUES (?, ?, ?)', (guild_id, tracks, now))
+                        else:
+                            db.execute('DELETE FROM queues WHERE guild_id = ?', (guild_id,))
+
+                    current = snapshot['current']
+                    if current is None and not snapshot['loop'] and snapshot['volume'] == 1.0:
+                        db.execute('DELETE FROM playback WHERE guild_id = ?', (guild_id,))
+                        continue
+                    db.execute(
+                        'INSERT OR REPLACE INTO playback VALUES (?, ?, ?, ?, ?, ?)',
+                        (
+                            guild_id,
+                            json.dumps(describe(current), separators=(',', ':')) if current else None,
+                            snapshot['position'], int(snapshot['loop']), snapshot['volume'], now
+                        )
+                    )
+
+                for guild_id in dropped:
+                    db.execute('DELETE FROM queues WHERE guild_id = ?', (guild_id,))
+                    db.execute('DELETE FROM playback WHERE guild_id = ?', (guild_id,))
+                db.commit()
+                self.saves += 1
+            except Exception as e:
+                logging.error(f"Error writing queue store: {e}")
+
+    def _read(self, guild_id):
+        """Load a guild's saved rows. Runs in the writer thread."""
+        with self._lock:
+            db = self._connect()
+            if not db:
+                return None, None
+            queue_row = db.execute('SELECT tracks FROM queues WHERE guild_id = ?', (guild_id,)).fetchone()
+            playback_row = db.execute(
+                'SELECT current, position, loop, volume FROM playback WHERE guild_id = ?', (guild_id,)
+            ).fetchone()
+        return (
+            [json.loads(line) for line in queue_row[0].split('\n')] if queue_row else [],
+            playback_row
+        )
+
+    async def restore(self, guild, queue):
+        """Fill a new queue with the guild's saved state. Returns the number of tracks restored.
+
+        The interrupted track goes back to the front and resumes where it stopped.
+        """
+        if not self.enabled:
+            return 0
+        loop = asyncio.get_running_loop()
+        try:
+            tracks, playback = await loop.run_in_executor(self._executor, self._read, guild.id)
+        except Exception as e:
+            logging.error(f"Error reading saved queue for guild {guild.id}: {e}")
+            return 0
+
+        current = None
+        if playback:
+            current, position, repeat, volume = playback
+            queue.loop = LoopMode(repeat)
+            queue.volume = volume
+            if current:
+                current = json.loads(current)
+                current['position'] = position
+                tracks.insert(0, current)
+
+        requesters = {}
+        for start in range(0, len(tracks), RESTORE_BATCH):
+            queue.extend(restore_entry(track, guild, requesters) for track in tracks[start:start + RESTORE_BATCH])
+            # Long queues are rebuilt in slices so other guilds keep playing
+            await asyncio.sleep(0)
+        if not current:
+            # The saved copy already matches, no need to write it straight back
+            self._saved[guild.id] = queue.version
+        if tracks:
+            self.restores += 1
+        return len(tracks)
+
+    def stats(self):
+        """Get store counters."""
+        return {'saves': self.saves, 'restores': self.restores, 'guilds': len(self._saved)}
+
+    def close(self):
+        """Stop the background saves."""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+
+queue_store = QueueStore()
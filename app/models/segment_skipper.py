@@ -0,0 +1,81 @@
+import os
+import math
+import logging
+import discord
+
+logger = logging.getLogger('SegmentSkipper')
+
+# Segments up to this many frames are skipped by reading past them inside one read(),
+# longer ones reopen FFmpeg with -ss. Kept small so the voice thread never stalls on it.
+DROP_SKIP_FRAMES = int(os.getenv('SPONSORBLOCK_DROP_FRAMES', '5'))
+# A segment ending this close to the end of the track just ends it
+END_MARGIN_SECONDS = 1.0
+
+FRAME_MS = discord.opus.Encoder.FRAME_LENGTH
+
+
+class SegmentSkippingAudio(discord.AudioSource):
+    """Audio source that skips SponsorBlock segments while playing.
+
+    Works on PCM frames and Opus packets alike, both are 20 ms. Counts frames
+    to know the position in the track and only looks up the segment index
+    when the position reaches the next segment start.
+    """
+    def __init__(self, open_audio, segments, *, start=0, duration=0):
+        self.open_audio = open_audio
+        self.segments = segments
+        self.duration = duration or 0
+        self.frames = int(start * 1000 / FRAME_MS)
+        self.skipped = 0
+        self.audio = open_audio(start)
+        self._next_start = segments.next_start(start)
+
+    @property
+    def position(self):
+        """Position in the track in seconds."""
+        return self.frames * FRAME_MS / 1000
+
+    def is_opus(self):
+        return self.audio.is_opus()
+
+    def _skip(self):
+        """Move past the segment at the current position.
+
+        Returns False if the segment runs to the end of the track.
+        """
+        position = self.position
+        segment = self.segments.find(position)
+        if segment is None:
+            self._next_start = self.segments.next_start(position)
+            return True
+
+        end = segment[1]
+        self.skipped += 1
+        if self.duration and end >= self.duration - END_MARGIN_SECONDS:
+            return False
+
+        frames = math.ceil((end - position) * 1000 / FRAME_MS)
+        if frames <= DROP_SKIP_FRAMES:
+            for _ in range(frames):
+                if not self.audio.read():
+                    return False
+                self.frames += 1
+        else:
+            self.audio.cleanup()
+            self.audio = self.open_audio(end)
+            self.frames = math.ceil(end * 1000 / FRAME_MS)
+
+        self._next_start = self.segments.next_start(self.position)
+        return True
+
+    def read(self):
+        if self._next_start is not None and self.position >= self._next_start:
+            if not self._skip():
+                return b''
+        data = self.audio.read()
+        if data:
+            self.frames += 1
+        return data
+
+    def cleanup(self):
+        self.audio.cleanup()
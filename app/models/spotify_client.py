@@ -1,19 +1,33 @@
 import os
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
+import time
+import asyncio
 from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import logging
+from utils.metrics import metrics
 
-logging.basicConfig(level=logging.ERROR)
+# Threads for blocking spotipy calls, which also bounds parallel page fetches
+SPOTIFY_WORKERS = int(os.getenv('SPOTIFY_WORKERS', '4'))
+
+PLAYLIST_PAGE_SIZE = 100
+ALBUM_PAGE_SIZE = 50
+# Only request the fields we turn into queue entries
+TRACK_FIELDS = 'track(id,name,duration_ms,external_ids(isrc),artists(name),album(images(url)))'
+PLAYLIST_FIELDS = f'name,owner(display_name),tracks(total,items({TRACK_FIELDS}))'
 
 class SpotifyClient:
-    """Handles Spotify API interactions."""
+    """Handles Spotify API interactions.
+
+    spotipy is imported and the credentials verified on first use, or in the
+    background once start() is called, so neither holds up the bot's login.
+    """
     def __init__(self):
         self.client_id = os.getenv('SPOTIFY_CLIENT_ID')
         self.client_secret = os.getenv('SPOTIFY_CLIENT_SECRET')
         self.spotify = None
-        if not self._initialize():
-            logging.error("Failed to initialize Spotify client")
+        self._ready = None  # future of the running or last _initialize
+        self._executor = ThreadPoolExecutor(max_workers=SPOTIFY_WORKERS, thread_name_prefix='spotify')
 
     def _initialize(self):
         """Initialize the Spotify client."""
@@ -21,29 +35,39 @@ class SpotifyClient:
             logging.error("Missing Spotify credentials")
             return False
             
+        started = time.perf_counter()
         try:
+            import spotipy
+            from spotipy.oauth2 import SpotifyClientCredentials
+
             credentials_manager = SpotifyClientCredentials(
                 client_id=self.client_id,
                 client_secret=self.client_secret
             )
-            self.spotify = spotipy.Spotify(client_credentials_manager=credentials_manager)
+            spotify = spotipy.Spotify(client_credentials_manager=credentials_manager)
             # Test the connection
-            self.spotify.user('spotify')  # Simple API call to verify connection
-            return True
+            spotify.user('spotify')  # Simple API call to verify connection
         except Exception as e:
             logging.error(f"Failed to initialize Spotify client: {e}")
-            self.spotify = None
             return False
+        self.spotify = spotify
+        logging.info(f"Spotify client ready in {time.perf_counter() - started:.2f} s")
+        return True
 
-    def check_connection(self):
-        """Check if Spotify client is properly initialized."""
-        try:
-            if self.spotify:
-                self.spotify.user('spotify')  # Test the connection
-                return True
-            return False
-        except:
-            return False
+    def start(self):
+        """Initialize the client in the background. Call from the event loop."""
+        if self._ready is None or (self._ready.done() and self.spotify is None):
+            loop = asyncio.get_running_loop()
+            self._ready = loop.run_in_executor(self._executor, self._initialize)
+        return self._ready
+
+    async def _client(self):
+        """Get the spotipy client, waiting for or retrying its initialization."""
+        if self.spotify is None:
+            await asyncio.shield(self.start())
+            if self.spotify is None:
+                raise RuntimeError("Spotify client is not available")
+        return self.spotify
 
     def is_spotify_url(self, url: str) -> bool:
         """Check if the URL is a Spotify URL."""
@@ -53,61 +77,89 @@ class SpotifyClient:
         except:
             return False
 
-    def get_track_info(self, url: str) -> dict:
-        """Get info for a single track."""
-        track = self.spotify.track(url)
+    async def fetch_track(self, url: str) -> dict:
+        """Get info for a single track without blocking the event loop."""
+        spotify = await self._client()
+        return self._format_track(await self._call(spotify.track, url))
+
+    async def _call(self, func, *args, **kwargs):
+        """Run a blocking spotipy call off the event loop."""
+        loop = asyncio.get_running_loop()
+        with metrics.timer('spotify_request_seconds', method=func.__name__):
+            return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    def _format_track(self, track, images=None):
+        """Convert a Spotify track object into a queue entry."""
+        if images is None:
+            images = (track.get('album') or {}).get('images') or []
+        artists = track.get('artists') or [{}]
         return {
             'title': track['name'],
-            'artist': track['artists'][0]['name'],
-            'duration': track['duration_ms'] / 1000,
-            'thumbnail': track['album']['images'][0]['url'] if track['album']['images'] else None
+            'artist': artists[0].get('name', ''),
+            'duration': (track.get('duration_ms') or 0) / 1000,
+            'thumbnail': images[0]['url'] if images else None,
+            # Keys of the YouTube match index, album track pages carry no ISRC
+            'spotify_id': track.get('id'),
+            'isrc': (track.get('external_ids') or {}).get('isrc')
         }
 
-    def get_playlist_tracks(self, url: str) -> tuple:
-        """Get all tracks from a Spotify playlist."""
-        playlist = self.spotify.playlist(url)
-        tracks = []
-        
+    def _iter_pages(self, first_page, total, page_size, fetch_page, parse):
+        """Yield pages of tracks in order while later pages are fetched in parallel."""
+        async def pages():
+            # Every page offset is known from the total, so request them all up front;
+            # the executor size bounds how many are in flight
+            futures = [
+                asyncio.ensure_future(self._call(fetch_page, offset))
+                for offset in range(page_size, total, page_size)
+            ]
+            try:
+                yield parse(first_page)
+                for future in futures:
+                    yield parse((await future)['items'])
+            finally:
+                for future in futures:
+                    future.cancel()
+        return pages()
+
+    async def stream_playlist(self, url: str) -> tuple:
+        """Get a playlist's info and an async iterator over its track pages."""
+        spotify = await self._client()
+        playlist = await self._call(spotify.playlist, url, fields=PLAYLIST_FIELDS)
         playlist_info = {
             'name': playlist['name'],
             'owner': playlist['owner']['display_name'],
             'total_tracks': playlist['tracks']['total']
         }
-        
-        results = playlist['tracks']
-        while results:
-            for item in results['items']:
-                track = item['track']
-                if track:
-                    tracks.append({
-                        'title': track['name'],
-                        'artist': track['artists'][0]['name'],
-                        'duration': track['duration_ms'] / 1000,
-                        'thumbnail': track['album']['images'][0]['url'] if track['album']['images'] else None
-                    })
-            
-            if results['next']:
-                results = self.spotify.next(results)
-            else:
-                break
-                
-        return tracks, playlist_info
-
-    def get_album_tracks(self, url: str) -> list:
-        results = self.spotify.album_tracks(url)
-        tracks = []
-        
-        while results:
-            for track in results['items']:
-                tracks.append({
-                    'title': track['name'],
-                    'artist': track['artists'][0]['name'],
-                    'album': track['album']['name'] if 'album' in track else None
-                })
-            
-            if results['next']:
-                results = self.spotify.next(results)
-            else:
-                break
-                
-        return tracks
+
+        def parse(items):
+            return [self._format_track(item['track']) for item in items if item.get('track')]
+
+        fetch_page = partial(
+            spotify.playlist_items, url,
+            fields=f'items({TRACK_FIELDS})', limit=PLAYLIST_PAGE_SIZE
+        )
+        pages = self._iter_pages(
+            playlist['tracks']['items'], playlist_info['total_tracks'], PLAYLIST_PAGE_SIZE,
+            lambda offset: fetch_page(offset=offset), parse
+        )
+        return playlist_info, pages
+
+    async def stream_album(self, url: str) -> tuple:
+        """Get an album's info and an async iterator over its track pages."""
+        spotify = await self._client()
+        album = await self._call(spotify.album, url)
+        album_info = {
+            'name': album['name'],
+            'owner': album['artists'][0]['name'] if album['artists'] else 'Unknown',
+            'total_tracks': album['tracks']['total']
+        }
+        images = album.get('images') or []
+
+        def parse(items):
+            return [self._format_track(track, images) for track in items if track]
+
+        pages = self._iter_pages(
+            album['tracks']['items'], album_info['total_tracks'], ALBUM_PAGE_SIZE,
+            lambda offset: spotify.album_tracks(url, limit=ALBUM_PAGE_SIZE, offset=offset), parse
+        )
+        return album_info, pages
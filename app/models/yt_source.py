@@ -1,13 +1,17 @@
+import os
 import discord
-import yt_dlp
 import asyncio
-import time
-from async_timeout import timeout
 import logging
-from utils.sponsorblock import SponsorBlockHandler
+from utils.sponsorblock import SegmentIndex, sponsorblock_handler
+from models.segment_skipper import SegmentSkippingAudio
+from utils.extraction_cache import extraction_cache
+from utils.audio_cache import audio_cache
+from utils.loudness_cache import loudness_cache
+from models.audio_filters import AudioFilters
+from utils.match_index import match_index, best_candidate, score_candidate
+from utils.metrics import metrics
+from utils.extraction_scheduler import extraction_scheduler, PRIORITY_NOW_PLAYING
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger('YTDLSource')
 
 # Define FFMPEG_OPTIONS globally
@@ -15,9 +19,23 @@ FFMPEG_OPTIONS = {
     'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5',
     'options': '-vn -loglevel error'
 }
+# Flat search results weighed when matching a Spotify track to a video
+SPOTIFY_CANDIDATES = int(os.getenv('SPOTIFY_CANDIDATES', '5'))
+# Copy Opus packets straight to Discord when no PCM processing is needed
+OPUS_PASSTHROUGH = os.getenv('OPUS_PASSTHROUGH', '1') == '1'
 
-class YTDLSource(discord.PCMVolumeTransformer):
-    """Enhanced YouTube downloader with error handling and metadata."""
+# Files from the audio cache need no reconnect handling
+LOCAL_FFMPEG_OPTIONS = {
+    'options': '-vn -loglevel error'
+}
+
+class YTDLSource:
+    """Track descriptor for a YouTube video.
+
+    Only holds metadata and the resolved stream URL so it can sit in the queue
+    without an FFmpeg process; the audio pipeline is created by create_audio
+    when the track is about to play.
+    """
     YTDL_OPTIONS = {
         'format': 'bestaudio/best',
         'extractaudio': True,
@@ -35,68 +53,249 @@ class YTDLSource(discord.PCMVolumeTransformer):
         'extract_flat': False,
         'force_generic_extractor': False
     }
+    # Search results only, no formats or signatures
+    SEARCH_OPTIONS = {
+        'extract_flat': 'in_playlist',
+        'skip_download': True,
+        'nocheckcertificate': True,
+        'quiet': True,
+        'no_warnings': True,
+        'source_address': '0.0.0.0'
+    }
 
     @classmethod
-    async def create_source(cls, search: str, *, loop=None, seek_seconds=0):
+    async def create_source(cls, search: str, *, loop=None, seek_seconds=0, priority=PRIORITY_NOW_PLAYING):
         """Creates a source from a YouTube URL or search term."""
         loop = loop or asyncio.get_event_loop()
         
         try:
-            with yt_dlp.YoutubeDL(cls.YTDL_OPTIONS) as ydl:
-                data = await loop.run_in_executor(None, lambda: ydl.extract_info(search, download=False))
-                
-                if not data:
-                    raise ValueError(f"Could not find any matches for: {search}")
-                    
-                if 'entries' in data:
-                    data = data['entries'][0]
-
-                # Modify FFMPEG options to include seeking if needed
-                ffmpeg_options = FFMPEG_OPTIONS.copy()
-                if seek_seconds > 0:
-                    ffmpeg_options['options'] = f'-ss {seek_seconds} ' + ffmpeg_options.get('options', '')
-
-
-                # Create source instance
-                audio = discord.FFmpegPCMAudio(data['url'], **ffmpeg_options)
-                source = cls(audio, data=data, volume=0.5)
-                
-                # Get segments to skip
-                if 'webpage_url' in data:
-                    source.sponsorblock = SponsorBlockHandler()
-                    source.skip_segments = await source.sponsorblock.get_skip_segments(data['webpage_url'])
-                    
-                    if source.skip_segments:
-                        logger.info(f"Found {len(source.skip_segments)} segments to skip")
-                
-                # Store metadata
-                source.data = {
-                    'title': data.get('title', 'Unknown'),
-                    'duration': data.get('duration', 0),
-                    'url': data.get('webpage_url', ''),
-                    'thumbnail': data.get('thumbnail', ''),
-                    'uploader': data.get('uploader', 'Unknown'),
-                    'description': data.get('description', ''),
-                    'view_count': data.get('view_count', 0),
-                    'like_count': data.get('like_count', 0),
-                    'upload_date': data.get('upload_date', ''),
-                    'channel_url': data.get('channel_url', ''),
-                    'tags': data.get('tags', []),
-                    'stream_url': data['url']
-                }
-
-                return source
+            data = await extraction_cache.get(search)
+            # Start the segment lookup alongside extraction when the video is already known
+            video_id = sponsorblock_handler.extract_video_id((data or {}).get('webpage_url') or search)
+            if video_id:
+                sponsorblock_handler.prefetch([video_id])
+
+            if data is None:
+                data = extraction_cache.put(search, await cls.extract(search, priority=priority))
+            elif not extraction_cache.stream_is_fresh(data) and not audio_cache.path_for(video_id):
+                # Metadata is still good, only the signed stream URL needs resolving
+                logger.info(f"Refreshing expired stream URL for: {data.get('title')}")
+                fresh = await cls.extract(data.get('webpage_url') or search, priority=priority)
+                data = extraction_cache.refresh_stream(search, fresh)
+
+            # Create the lightweight descriptor, FFmpeg is only opened at play time
+            source = cls(data=data)
+            source.seek_seconds = seek_seconds
+
+            # Get segments to skip; the latency budget only counts from here, so a
+            # lookup started above had the whole extraction to finish. The stored
+            # loudness is read into memory meanwhile for create_audio.
+            source.skip_segments, _ = await asyncio.gather(
+                sponsorblock_handler.get_skip_segments(data.get('webpage_url', '')),
+                loudness_cache.load(source.video_id)
+            )
+
+            if source.skip_segments:
+                logger.info(f"Found {len(source.skip_segments)} segments to skip")
+
+            return source
 
         except Exception as e:
             logger.error(f"Error creating source: {e}")
             raise
 
-    def __init__(self, source, *, data=None, volume=0.5):
-        super().__init__(source, volume)
-        self.data = data or {}
-        self.title = self.data.get('title', 'Unknown')
-        self.url = self.data.get('url', '')
-        self.duration = self.data.get('duration', 0)
-        self.stream_url = self.data.get('url', '')
-        self.skip_segments = []
-        self.sponsorblock = SponsorBlockHandler()
+    @classmethod
+    async def create_entry(cls, search: str, *, priority=PRIORITY_NOW_PLAYING):
+        """Resolve a URL or search term into a queue entry without extracting its stream.
+
+        Searches only run a flat search for the video's id, title, duration and
+        thumbnail; the stream URL is extracted when the entry is prefetched or
+        played. Unknown URLs still need a full extraction, which is cached.
+        """
+        data = await extraction_cache.get(search)
+        if data is None and search.strip().startswith(('http://', 'https://')):
+            data = extraction_cache.put(search, await cls.extract(search, priority=priority))
+        if data is not None:
+            return {
+                'title': data.get('title', 'Unknown'),
+                'artist': data.get('uploader', ''),
+                'duration': data.get('duration') or 0,
+                'thumbnail': data.get('thumbnail'),
+                'webpage_url': data.get('webpage_url') or search
+            }
+
+        results = await cls.search(search, 1, priority=priority)
+        if not results:
+            raise ValueError(f"Could not find any matches for: {search}")
+        result = results[0]
+        return {
+            'title': result.get('title') or 'Unknown',
+            'artist': result.get('channel') or result.get('uploader') or '',
+            'duration': result.get('duration') or 0,
+            'thumbnail': result.get('thumbnail'),
+            'webpage_url': f"https://www.youtube.com/watch?v={result['id']}"
+        }
+
+    @classmethod
+    async def from_spotify_track(cls, track, *, loop=None, priority=PRIORITY_NOW_PLAYING):
+        """Creates a source for a dict queue entry: a Spotify track, or a video queued by URL."""
+        query = await cls.match_spotify_track(track, priority=priority)
+        try:
+            source = await cls.create_source(
+                query, loop=loop, seek_seconds=track.get('position', 0), priority=priority
+            )
+        except Exception:
+            if not track.get('webpage_url'):
+                # Don't keep sending the track to a video that no longer plays
+                match_index.discard(track)
+            raise
+        source.requester = track.get('requester')
+        # Keep Spotify metadata for display
+        source.title = track['title']
+        source.artist = track.get('artist', '')
+        source.duration = track.get('duration') or source.duration
+        return source
+
+    @classmethod
+    async def match_spotify_track(cls, track, *, priority=PRIORITY_NOW_PLAYING):
+        """Get the YouTube URL to play for a Spotify track.
+
+        Tracks matched before come straight from the match index; others are
+        picked from a flat search by duration and title. Falls back to the
+        plain search query if no result could be scored.
+        """
+        if track.get('webpage_url'):
+            return track['webpage_url']
+        video_id = await match_index.get(track)
+        if video_id is None:
+            try:
+                candidates = await cls.search(cls.spotify_query(track), priority=priority)
+            except Exception as e:
+                logger.error(f"Error searching for {track.get('title')}: {e}")
+                candidates = []
+            best = best_candidate(track, candidates)
+            if best is None:
+                return cls.spotify_query(track)
+            video_id = best['id']
+            match_index.put(track, video_id, score_candidate(track, best))
+        return f"https://www.youtube.com/watch?v={video_id}"
+
+    @classmethod
+    async def search(cls, query, count=SPOTIFY_CANDIDATES, *, priority=PRIORITY_NOW_PLAYING):
+        """Run a flat YouTube search returning the id, title, duration and channel of each result."""
+        return await extraction_scheduler.extract(
+            cls.SEARCH_OPTIONS, f"ytsearch{count}:{query}", priority, search=True
+        )
+
+    @staticmethod
+    def spotify_query(track):
+        """Get the YouTube search used for a Spotify track, or the URL of a restored one."""
+        if track.get('webpage_url'):
+            return track['webpage_url']
+        return f"{track['title']} {track.get('artist', '')}"
+
+    @classmethod
+    async def extract(cls, search: str, *, priority=PRIORITY_NOW_PLAYING):
+        """Run a full yt-dlp extraction for a URL or search term."""
+        data = await extraction_scheduler.extract(cls.YTDL_OPTIONS, search, priority)
+        if not data:
+            raise ValueError(f"Could not find any matches for: {search}")
+        return data
+
+    def __init__(self, data=None):
+        data = data or {}
+        self.data = {
+            'title': data.get('title', 'Unknown'),
+            'duration': data.get('duration', 0),
+            'url': data.get('webpage_url', ''),
+            'thumbnail': data.get('thumbnail', ''),
+            'uploader': data.get('uploader', 'Unknown'),
+            'description': data.get('description', ''),
+            'view_count': data.get('view_count', 0),
+            'like_count': data.get('like_count', 0),
+            'upload_date': data.get('upload_date', ''),
+            'channel_url': data.get('channel_url', ''),
+            'tags': data.get('tags', []),
+            'stream_url': data.get('url', ''),
+            'acodec': data.get('acodec')
+        }
+        self.title = self.data['title']
+        self.url = self.data['url']
+        self.duration = self.data['duration']
+        self.stream_url = self.data['stream_url']
+        self.codec = self.data['acodec']
+        self.video_id = sponsorblock_handler.extract_video_id(self.url) if self.url else None
+        self.requester = None
+        self.seek_seconds = 0
+        self.skip_segments = SegmentIndex()
+
+    def replay_entry(self):
+        """Get a queue entry that plays this track again.
+
+        It points at the video itself, so it resolves through the extraction
+        cache without a search and only re-extracts once the stream URL expired.
+        """
+        return {
+            'title': self.title,
+            'artist': getattr(self, 'artist', None) or self.data.get('uploader'),
+            'duration': self.duration,
+            'thumbnail': self.data.get('thumbnail'),
+            'webpage_url': self.url,
+            'requester': self.requester
+        }
+
+    @property
+    def skipped_seconds(self):
+        """Seconds of the track that SponsorBlock skipping will cut."""
+        return self.skip_segments.skipped_after(self.seek_seconds)
+
+    def can_passthrough(self, filters=None):
+        """Check if the track can be sent as Opus without decoding it."""
+        if not OPUS_PASSTHROUGH or (filters is not None and not filters.is_neutral()):
+            return False
+        # The audio cache only ever stores Opus
+        return self.codec == 'opus' or audio_cache.path_for(self.video_id) is not None
+
+    def open_stream(self, seek=0, opus=False):
+        """Open an FFmpeg stream, seeking on the input for a fast start.
+
+        Plays from the local audio cache when the track has been downloaded.
+        With opus=True the Opus packets are copied instead of decoded to PCM.
+        """
+        path = audio_cache.path_for(self.video_id)
+        ffmpeg_options = (LOCAL_FFMPEG_OPTIONS if path else FFMPEG_OPTIONS).copy()
+        if seek > 0:
+            ffmpeg_options['before_options'] = f"-ss {seek} " + ffmpeg_options.get('before_options', '')
+        with metrics.timer('ffmpeg_spawn_seconds', mode='opus' if opus else 'pcm'):
+            if opus:
+                return discord.FFmpegOpusAudio(path or self.stream_url, codec='copy', **ffmpeg_options)
+            return discord.FFmpegPCMAudio(path or self.stream_url, **ffmpeg_options)
+
+    def create_audio(self, filters=None):
+        """Open the audio stream for this track.
+
+        Uses Opus passthrough when no filter is active, otherwise decodes to
+        PCM and runs it through the guild's filters.
+        """
+        # Counted once per stream opened; the helpers below look it up again uncounted
+        audio_cache.lookup(self.video_id)
+        opus = self.can_passthrough(filters)
+        if self.skip_segments:
+            stream = SegmentSkippingAudio(
+                lambda seek: self.open_stream(seek, opus=opus),
+                self.skip_segments,
+                start=self.seek_seconds,
+                duration=self.duration
+            )
+        else:
+            stream = self.open_stream(self.seek_seconds, opus=opus)
+
+        if opus:
+            return stream
+        # numpy is only loaded once something needs decoding
+        from models.pcm_filter import FilteredAudio
+        video_id = self.video_id
+        return FilteredAudio(
+            stream, filters or AudioFilters(), loudness_cache.get(video_id),
+            on_measured=lambda loudness: loudness_cache.put(video_id, loudness)
+        )
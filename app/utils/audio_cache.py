@@ -0,0 +1,209 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+AUDIO_CACHE_ENABLED = os.getenv('AUDIO_CACHE', '0') == '1'
+AUDIO_CACHE_DIR = os.getenv('AUDIO_CACHE_DIR', 'cache/audio')
+AUDIO_CACHE_MAX_MB = int(os.getenv('AUDIO_CACHE_MAX_MB', '2048'))
+# Download a track once it has been played this many times
+AUDIO_CACHE_MIN_PLAYS = int(os.getenv('AUDIO_CACHE_MIN_PLAYS', '3'))
+AUDIO_CACHE_WORKERS = int(os.getenv('AUDIO_CACHE_WORKERS', '1'))
+
+# Opus only, so the file can be stored as is in its WebM container
+DOWNLOAD_OPTIONS = {
+    'format': 'bestaudio[acodec=opus]',
+    'noplaylist': True,
+    'quiet': True,
+    'no_warnings': True,
+    'nocheckcertificate': True,
+    'noprogress': True,
+}
+
+
+class AudioCache:
+    """Size-bounded directory of downloaded Opus tracks keyed by video id.
+
+    Plays are counted per video id; a track is downloaded in the background
+    once it is played often enough. When the directory grows past its limit
+    the least played files go first, oldest play breaking ties. The index
+    is loaded and play counts are written on a single SQLite thread; the
+    event loop only reads the in-memory file map.
+    """
+    def __init__(self, directory=AUDIO_CACHE_DIR, max_bytes=AUDIO_CACHE_MAX_MB * 1024 * 1024,
+                 min_plays=AUDIO_CACHE_MIN_PLAYS, enabled=AUDIO_CACHE_ENABLED):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.min_plays = min_plays
+        self.enabled = enabled
+        self._files = {}  # video id -> (path, size)
+        self._downloading = set()
+        self._db = None
+        self._lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='audio-cache-index')
+        self._opening = False
+        self._executor = None
+        self.hits = 0
+        self.misses = 0
+        self.downloads = 0
+        self.evictions = 0
+
+    def _connect(self):
+        """Open the index and load the known files on first use."""
+        if self._db is not None:
+            return self._db
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            db = sqlite3.connect(os.path.join(self.directory, 'index.db'), check_same_thread=False)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS plays ('
+                'video_id TEXT PRIMARY KEY, plays INTEGER NOT NULL, last_played REAL NOT NULL)'
+            )
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS files ('
+                'video_id TEXT PRIMARY KEY, path TEXT NOT NULL, size INTEGER NOT NULL)'
+            )
+            db.commit()
+
+            for video_id, path, size in db.execute('SELECT video_id, path, size FROM files').fetchall():
+                if os.path.exists(path):
+                    self._files[video_id] = (path, size)
+                else:
+                    db.execute('DELETE FROM files WHERE video_id = ?', (video_id,))
+            db.commit()
+            self._db = db
+        except Exception as e:
+            logging.error(f"Failed to open audio cache at {self.directory}: {e}")
+            self._db = False
+        return self._db
+
+    def _open(self):
+        """Load the index in the background on first use."""
+        if self._db is None and not self._opening:
+            self._opening = True
+            self._writer.submit(self._connect_locked)
+
+    def _connect_locked(self):
+        with self._lock:
+            self._connect()
+
+    def path_for(self, video_id):
+        """Get the local file for a video, or None. Files show up once the index has loaded."""
+        if not self.enabled or not video_id:
+            return None
+        self._open()
+        item = self._files.get(video_id)
+        if item and os.path.exists(item[0]):
+            return item[0]
+        return None
+
+    def lookup(self, video_id):
+        """Like path_for, but counted in the hit rate. Call once per track opened."""
+        path = self.path_for(video_id)
+        if self.enabled and video_id:
+            if path:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return path
+
+    def record_play(self, video_id, url):
+        """Count a play and start a background download once a track is popular."""
+        if not self.enabled or not video_id:
+            return
+        self._writer.submit(self._record_play, video_id, url)
+
+    def _record_play(self, video_id, url):
+        """Count a play on disk. Runs in the index thread."""
+        with self._lock:
+            db = self._connect()
+            if not db:
+                return
+            try:
+                db.execute(
+                    'INSERT INTO plays VALUES (?, 1, ?) ON CONFLICT(video_id) '
+                    'DO UPDATE SET plays = plays + 1, last_played = excluded.last_played',
+                    (video_id, time.time())
+                )
+                db.commit()
+                plays = db.execute('SELECT plays FROM plays WHERE video_id = ?', (video_id,)).fetchone()[0]
+            except Exception as e:
+                logging.error(f"Error recording play: {e}")
+                return
+
+            if plays < self.min_plays or video_id in self._files or video_id in self._downloading:
+                return
+            self._downloading.add(video_id)
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=AUDIO_CACHE_WORKERS, thread_name_prefix='audio-cache')
+        future = self._executor.submit(self._download, video_id, url)
+        future.add_done_callback(lambda _: self._downloading.discard(video_id))
+
+    def _download(self, video_id, url):
+        """Download a track's Opus audio into the cache directory."""
+        import yt_dlp
+
+        options = dict(DOWNLOAD_OPTIONS, outtmpl=os.path.join(self.directory, '%(id)s.%(ext)s'))
+        try:
+            with yt_dlp.YoutubeDL(options) as ydl:
+                info = ydl.extract_info(url, download=True)
+                downloads = info.get('requested_downloads') or []
+                path = downloads[0].get('filepath') if downloads else ydl.prepare_filename(info)
+        except Exception as e:
+            # Usually no Opus format is offered, the track keeps streaming
+            logging.error(f"Error caching audio for {video_id}: {e}")
+            return
+
+        if not path or not os.path.exists(path):
+            return
+        size = os.path.getsize(path)
+        with self._lock:
+            db = self._connect()
+            self._files[video_id] = (path, size)
+            self.downloads += 1
+            if db:
+                db.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?)', (video_id, path, size))
+                db.commit()
+                self._evict(db)
+
+    def _evict(self, db):
+        """Delete the least played files until the cache fits. Called with the lock held."""
+        total = sum(size for _, size in self._files.values())
+        if total <= self.max_bytes:
+            return
+
+        rows = db.execute(
+            'SELECT f.video_id FROM files f LEFT JOIN plays p ON p.video_id = f.video_id '
+            'ORDER BY COALESCE(p.plays, 0), COALESCE(p.last_played, 0)'
+        ).fetchall()
+        for (video_id,) in rows:
+            if total <= self.max_bytes:
+                break
+            path, size = self._files.pop(video_id, (None, 0))
+            total -= size
+            db.execute('DELETE FROM files WHERE video_id = ?', (video_id,))
+            self.evictions += 1
+            try:
+                if path:
+                    os.remove(path)
+            except OSError as e:
+                logging.error(f"Error removing cached audio {path}: {e}")
+        db.commit()
+
+    def stats(self):
+        """Get cache counters."""
+        return {
+            'files': len(self._files),
+            'bytes': sum(size for _, size in self._files.values()),
+            'hits': self.hits,
+            'misses': self.misses,
+            'downloads': self.downloads,
+            'evictions': self.evictions
+        }
+
+
+audio_cache = AudioCache()
@@ -0,0 +1,64 @@
+import time
+import asyncio
+import logging
+import aiohttp
+
+GATEWAY_URL = 'https://discord.com/api/v10/gateway/bot'
+# Per-worker values that don't add up across processes, reported as their mean
+AVERAGED_STATS = ('latency_ms',)
+
+
+async def fetch_gateway_info(token):
+    """Get Discord's recommended shard count and identify concurrency."""
+    headers = {'Authorization': f'Bot {token}'}
+    async with aiohttp.ClientSession() as session:
+        async with session.get(GATEWAY_URL, headers=headers) as response:
+            response.raise_for_status()
+            data = await response.json()
+    return data['shards'], data['session_start_limit'].get('max_concurrency', 1)
+
+
+class ClusterStats:
+    """Stats shared between worker processes through a multiprocessing Manager dict.
+
+    Each worker only writes its own key; any worker can read the whole cluster.
+    Every access is a blocking round trip to the Manager process, so the
+    async methods run it in the default executor.
+    """
+    def __init__(self, shared, worker_id):
+        self.shared = shared
+        self.worker_id = worker_id
+
+    def _publish(self, snapshot):
+        try:
+            self.shared[self.worker_id] = dict(snapshot, updated=time.time())
+        except Exception as e:
+            logging.error(f"Failed to publish cluster stats: {e}")
+
+    def _workers(self):
+        try:
+            return dict(self.shared)
+        except Exception as e:
+            logging.error(f"Failed to read cluster stats: {e}")
+            return {}
+
+    async def publish(self, snapshot):
+        """Store this worker's latest stats."""
+        await asyncio.get_running_loop().run_in_executor(None, self._publish, snapshot)
+
+    async def workers(self):
+        """Get the latest stats of every worker."""
+        return await asyncio.get_running_loop().run_in_executor(None, self._workers)
+
+    async def totals(self):
+        """Combine the numeric stats across workers: counts are summed, AVERAGED_STATS averaged."""
+        totals, reported = {}, {}
+        for snapshot in (await self.workers()).values():
+            for key, value in snapshot.items():
+                if key != 'updated' and isinstance(value, (int, float)):
+                    totals[key] = totals.get(key, 0) + value
+                    reported[key] = reported.get(key, 0) + 1
+        for key in AVERAGED_STATS:
+            if key in totals:
+                totals[key] = round(totals[key] / reported[key])
+        return totals
@@ -0,0 +1,243 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs
+
+CACHE_PATH = os.getenv('EXTRACTION_CACHE_PATH', 'cache/extraction.db')
+MEMORY_SIZE = int(os.getenv('EXTRACTION_CACHE_SIZE', '512'))
+
+# Refresh signed stream URLs a bit before googlevideo starts rejecting them
+STREAM_EXPIRY_MARGIN = 300
+# Used when a stream URL carries no expire= parameter
+DEFAULT_STREAM_TTL = 3600
+
+# Metadata that does not change between extractions and is kept indefinitely
+METADATA_FIELDS = (
+    'id', 'title', 'duration', 'uploader', 'thumbnail', 'webpage_url',
+    'description', 'view_count', 'like_count', 'upload_date', 'channel_url', 'tags', 'acodec'
+)
+
+YOUTUBE_HOSTS = ('youtube.com', 'www.youtube.com', 'm.youtube.com', 'music.youtube.com')
+
+
+def parse_stream_expiry(stream_url):
+    """Get the expiry timestamp embedded in a signed googlevideo URL."""
+    try:
+        parsed = urlparse(stream_url)
+        expire = parse_qs(parsed.query).get('expire')
+        if expire:
+            return float(expire[0])
+        # Manifest style URLs carry the parameters in the path
+        match = re.search(r'/expire/(\d+)', parsed.path)
+        if match:
+            return float(match.group(1))
+    except Exception as e:
+        logging.error(f"Error parsing stream expiry: {e}")
+    return time.time() + DEFAULT_STREAM_TTL
+
+
+def normalize_key(query):
+    """Normalize a query or URL into a cache key."""
+    query = query.strip()
+    try:
+        parsed = urlparse(query)
+        if parsed.hostname == 'youtu.be' and len(parsed.path) > 1:
+            return f"yt:{parsed.path[1:].split('/')[0]}"
+        if parsed.hostname in YOUTUBE_HOSTS:
+            if parsed.path == '/watch':
+                video_id = parse_qs(parsed.query).get('v')
+                if video_id:
+                    return f"yt:{video_id[0]}"
+            for prefix in ('/embed/', '/v/', '/shorts/'):
+                if parsed.path.startswith(prefix):
+                    return f"yt:{parsed.path.split('/')[2]}"
+    except Exception:
+        pass
+    if query.startswith(('http://', 'https://')):
+        return f"url:{query}"
+    return f"q:{' '.join(query.casefold().split())}"
+
+
+class ExtractionCache:
+    """Two-level (memory LRU + SQLite) cache of yt-dlp extraction results.
+
+    The event loop only touches memory: disk reads are awaited from, and
+    writes queued on, a single SQLite thread.
+    """
+    def __init__(self, path=CACHE_PATH, max_memory=MEMORY_SIZE):
+        self.path = path
+        self.max_memory = max_memory
+        self._entries = OrderedDict()
+        self._aliases = OrderedDict()
+        self._db = None
+        self._lock = threading.Lock()  # guards the memory LRU only
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='extraction-cache')
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stream_refreshes = 0
+
+    def _connect(self):
+        """Open the on-disk store on first use."""
+        if self._db is not None:
+            return self._db
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS tracks ('
+                'video_id TEXT PRIMARY KEY, metadata TEXT NOT NULL, '
+                'stream_url TEXT, stream_expires REAL)'
+            )
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS aliases ('
+                'key TEXT PRIMARY KEY, video_id TEXT NOT NULL)'
+            )
+            db.commit()
+            self._db = db
+        except Exception as e:
+            logging.error(f"Failed to open extraction cache at {self.path}: {e}")
+            self._db = False
+        return self._db
+
+    def _remember(self, key, video_id, entry):
+        """Store an entry in the memory LRU."""
+        self._aliases[key] = video_id
+        self._aliases.move_to_end(key)
+        self._entries[video_id] = entry
+        self._entries.move_to_end(video_id)
+
+        while len(self._entries) > self.max_memory:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        while len(self._aliases) > self.max_memory * 4:
+            self._aliases.popitem(last=False)
+
+    def _load(self, key):
+        """Load an entry from disk. Runs in the SQLite thread."""
+        try:
+            db = self._connect()
+            if not db:
+                return None, None
+            row = db.execute(
+                'SELECT t.video_id, t.metadata, t.stream_url, t.stream_expires '
+                'FROM aliases a JOIN tracks t ON t.video_id = a.video_id WHERE a.key = ?',
+                (key,)
+            ).fetchone()
+        except Exception as e:
+            logging.error(f"Error reading extraction cache: {e}")
+            return None, None
+        if not row:
+            return None, None
+        video_id, metadata, stream_url, stream_expires = row
+        entry = json.loads(metadata)
+        entry['url'] = stream_url
+        entry['stream_expires'] = stream_expires or 0
+        return video_id, entry
+
+    def _memory_get(self, key):
+        with self._lock:
+            video_id = self._aliases.get(key)
+            if video_id and video_id in self._entries:
+                self._aliases.move_to_end(key)
+                self._entries.move_to_end(video_id)
+                return dict(self._entries[video_id])
+        return None
+
+    def peek(self, query):
+        """Get extraction data for a query if it is in memory, without touching disk."""
+        return self._memory_get(normalize_key(query))
+
+    async def get(self, query):
+        """Get cached extraction data for a query, or None."""
+        key = normalize_key(query)
+        entry = self._memory_get(key)
+        if entry is not None:
+            self.hits += 1
+            return entry
+
+        loop = asyncio.get_running_loop()
+        video_id, entry = await loop.run_in_executor(self._executor, self._load, key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        with self._lock:
+            self._remember(key, video_id, entry)
+        self.hits += 1
+        return dict(entry)
+
+    def put(self, query, data):
+        """Cache the result of an extraction and return the cached form."""
+        video_id = data.get('id') or data.get('webpage_url')
+        if not video_id:
+            return data
+
+        entry = {field: data[field] for field in METADATA_FIELDS if data.get(field) is not None}
+        entry['url'] = data.get('url')
+        entry['stream_expires'] = parse_stream_expiry(entry['url']) if entry['url'] else 0
+
+        # A search and the video's own URL should both resolve to the same entry
+        keys = {normalize_key(query), f"yt:{video_id}"}
+        if entry.get('webpage_url'):
+            keys.add(normalize_key(entry['webpage_url']))
+
+        with self._lock:
+            for key in keys:
+                self._remember(key, video_id, entry)
+        self._executor.submit(self._write, video_id, entry, keys)
+        return dict(entry)
+
+    def _write(self, video_id, entry, keys):
+        """Store an entry on disk. Runs in the SQLite thread."""
+        db = self._connect()
+        if not db:
+            return
+        try:
+            metadata = {k: v for k, v in entry.items() if k not in ('url', 'stream_expires')}
+            db.execute(
+                'INSERT OR REPLACE INTO tracks VALUES (?, ?, ?, ?)',
+                (video_id, json.dumps(metadata), entry['url'], entry['stream_expires'])
+            )
+            db.executemany(
+                'INSERT OR REPLACE INTO aliases VALUES (?, ?)',
+                [(key, video_id) for key in keys]
+            )
+            db.commit()
+        except Exception as e:
+            logging.error(f"Error writing extraction cache: {e}")
+
+    def refresh_stream(self, query, data):
+        """Replace an expired stream URL with a freshly resolved one."""
+        self.stream_refreshes += 1
+        return self.put(query, data)
+
+    def stream_is_fresh(self, entry):
+        """Check if the cached stream URL can still be used."""
+        if not entry.get('url'):
+            return False
+        return entry.get('stream_expires', 0) - STREAM_EXPIRY_MARGIN > time.time()
+
+    def stats(self):
+        """Get cache counters."""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'stream_refreshes': self.stream_refreshes,
+            'memory_entries': len(self._entries)
+        }
+
+
+extraction_cache = ExtractionCache()
@@ -0,0 +1,170 @@
+import os
+import asyncio
+import itertools
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from utils.extraction_cache import normalize_key
+from utils.metrics import metrics
+
+EXTRACTION_WORKERS = int(os.getenv('EXTRACTION_WORKERS', '4'))
+# Run yt-dlp in worker processes instead of threads to keep its parsing off the GIL
+EXTRACTION_PROCESSES = os.getenv('EXTRACTION_PROCESSES', '0') == '1'
+
+# Lower runs first
+PRIORITY_NOW_PLAYING = 0  # a listener is waiting on this track
+PRIORITY_PREFETCH = 1     # upcoming tracks resolved in the background
+
+# Bulky parts of an info dict that are never used after extraction
+DROPPED_FIELDS = (
+    'formats', 'requested_formats', 'thumbnails', 'automatic_captions',
+    'subtitles', 'heatmap', 'chapters', 'http_headers'
+)
+# What a flat search result keeps
+SEARCH_FIELDS = ('id', 'title', 'duration', 'channel', 'uploader', 'view_count')
+
+
+def run_extraction(options, query):
+    """Run yt-dlp for a query and return a trimmed, picklable info dict."""
+    import yt_dlp
+
+    with yt_dlp.YoutubeDL(options) as ydl:
+        data = ydl.extract_info(query, download=False)
+        if not data:
+            return None
+
+        if 'entries' in data:
+            entries = [entry for entry in data['entries'] if entry]
+            if not entries:
+                return None
+            data = entries[0]
+
+        data = ydl.sanitize_info(data)
+        for field in DROPPED_FIELDS:
+            data.pop(field, None)
+        return data
+
+
+def run_search(options, query):
+    """Run a flat yt-dlp search and return the trimmed results."""
+    import yt_dlp
+
+    with yt_dlp.YoutubeDL(options) as ydl:
+        data = ydl.extract_info(query, download=False)
+    results = []
+    for entry in (data or {}).get('entries') or []:
+        if not entry or not entry.get('id'):
+            continue
+        result = {field: entry.get(field) for field in SEARCH_FIELDS}
+        thumbnails = entry.get('thumbnails') or []
+        result['thumbnail'] = entry.get('thumbnail') or (thumbnails[-1].get('url') if thumbnails else None)
+        results.append(result)
+    return results
+
+
+class ExtractionJob:
+    """A queued extraction shared by every caller asking for the same query."""
+    def __init__(self, key, options, query, priority, future, search=False):
+        self.key = key
+        self.options = options
+        self.query = query
+        self.search = search
+        self.priority = priority
+        self.future = future
+        self.waiters = 0
+        self.started = False
+
+
+class ExtractionScheduler:
+    """Bounded yt-dlp worker pool with priorities and request coalescing."""
+    def __init__(self, workers=EXTRACTION_WORKERS, use_processes=EXTRACTION_PROCESSES):
+        self.workers = workers
+        self.use_processes = use_processes
+        self._executor = None
+        self._queue = None
+        self._tasks = []
+        self._jobs = {}
+        self._sequence = itertools.count()
+        self.coalesced = 0
+
+    def _start(self):
+        """Create the executor and worker tasks on first use."""
+        if self.use_processes:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='ytdl')
+        self._queue = asyncio.PriorityQueue()
+        # One task per executor slot so queued jobs are picked strictly by priority
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def _push(self, job):
+        self._queue.put_nowait((job.priority, next(self._sequence), job))
+
+    async def extract(self, options, query, priority=PRIORITY_NOW_PLAYING, search=False):
+        """Extract info for a query, joining an identical request if one is in flight.
+
+        With search=True the query is a flat search and the result is a list of matches.
+        """
+        if self._queue is None:
+            self._start()
+
+        key = (normalize_key(query), tuple(sorted(options.items())), search)
+        job = self._jobs.get(key)
+        if job is None:
+            job = ExtractionJob(key, options, query, priority, asyncio.get_running_loop().create_future(), search)
+            self._jobs[key] = job
+            self._push(job)
+        else:
+            self.coalesced += 1
+            if priority < job.priority and not job.started:
+                # Requeue at the higher priority, the old entry is skipped by the workers
+                job.priority = priority
+                self._push(job)
+
+        job.waiters += 1
+        try:
+            return await asyncio.shield(job.future)
+        except asyncio.CancelledError:
+            job.waiters -= 1
+            if job.waiters == 0 and not job.started and not job.future.done():
+                # Nobody wants the result anymore, drop it before a worker picks it up
+                job.future.cancel()
+                self._jobs.pop(job.key, None)
+            raise
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            priority, _, job = await self._queue.get()
+            if job.started or job.future.done() or priority != job.priority:
+                continue
+
+            job.started = True
+            try:
+                run = run_search if job.search else run_extraction
+                with metrics.timer('extraction_seconds', priority=job.priority, kind='search' if job.search else 'full'):
+                    result = await loop.run_in_executor(self._executor, run, job.options, job.query)
+                if not job.future.done():
+                    job.future.set_result(result)
+            except Exception as e:
+                metrics.inc('extraction_errors_total')
+                if not job.future.done():
+                    job.future.set_exception(e)
+            finally:
+                self._jobs.pop(job.key, None)
+                if job.future.done() and not job.future.cancelled() and not job.waiters:
+                    # Mark an unawaited failure as retrieved
+                    job.future.exception()
+
+    def stats(self):
+        """Get scheduler counters."""
+        return {
+            'queued': self._queue.qsize() if self._queue else 0,
+            'in_flight': len(self._jobs),
+            'coalesced': self.coalesced
+        }
+
+
+extraction_scheduler = ExtractionScheduler()
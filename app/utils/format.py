@@ -19,4 +19,18 @@ def format_duration(seconds):
         parts.append(f"{seconds}s")
 
     return " ".join(parts)
-  
\ No newline at end of file
+  
+
+def parse_duration(text):
+    """Parses seconds, M:SS or H:MM:SS into seconds."""
+    parts = text.strip().split(':')
+    if not 1 <= len(parts) <= 3:
+        raise ValueError(f"Invalid time: {text}")
+
+    seconds = 0.0
+    for part in parts:
+        value = float(part)
+        if value < 0:
+            raise ValueError(f"Invalid time: {text}")
+        seconds = seconds * 60 + value
+    return seconds
@@ -0,0 +1,109 @@
+import os
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+LOUDNESS_CACHE_PATH = os.getenv('LOUDNESS_CACHE_PATH', 'cache/loudness.db')
+LOUDNESS_CACHE_SIZE = int(os.getenv('LOUDNESS_CACHE_SIZE', '4096'))
+
+
+class LoudnessCache:
+    """Measured loudness of each track in dBFS, keyed by video id.
+
+    Written once a track has been analyzed while playing, so normalization
+    can apply the right gain from the first frame on every later play.
+    get only reads memory; load warms it from disk on the SQLite thread
+    while a track resolves, and writes are queued on that thread too.
+    """
+    def __init__(self, path=LOUDNESS_CACHE_PATH, max_memory=LOUDNESS_CACHE_SIZE):
+        self.path = path
+        self.max_memory = max_memory
+        self._memory = OrderedDict()
+        self._db = None
+        self._lock = threading.Lock()  # guards the memory LRU only
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='loudness-cache')
+
+    def _connect(self):
+        """Open the on-disk cache on first use."""
+        if self._db is not None:
+            return self._db
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS loudness ('
+                'video_id TEXT PRIMARY KEY, loudness REAL NOT NULL, measured REAL NOT NULL)'
+            )
+            db.commit()
+            self._db = db
+        except Exception as e:
+            logging.error(f"Failed to open loudness cache at {self.path}: {e}")
+            self._db = False
+        return self._db
+
+    def _remember(self, video_id, loudness):
+        self._memory[video_id] = loudness
+        self._memory.move_to_end(video_id)
+        while len(self._memory) > self.max_memory:
+            self._memory.popitem(last=False)
+
+    def get(self, video_id):
+        """Get a track's loudness from memory, or None if it isn't known."""
+        if not video_id:
+            return None
+        with self._lock:
+            if video_id in self._memory:
+                self._memory.move_to_end(video_id)
+                return self._memory[video_id]
+        return None
+
+    def _load(self, video_id):
+        """Read a track's loudness from disk. Runs in the SQLite thread."""
+        db = self._connect()
+        if not db:
+            return None
+        try:
+            row = db.execute('SELECT loudness FROM loudness WHERE video_id = ?', (video_id,)).fetchone()
+        except Exception as e:
+            logging.error(f"Error reading loudness cache: {e}")
+            return None
+        return row[0] if row else None
+
+    async def load(self, video_id):
+        """Bring a track's stored loudness into memory so get can return it."""
+        if not video_id or self.get(video_id) is not None:
+            return
+        loop = asyncio.get_running_loop()
+        loudness = await loop.run_in_executor(self._executor, self._load, video_id)
+        if loudness is not None:
+            with self._lock:
+                self._remember(video_id, loudness)
+
+    def put(self, video_id, loudness):
+        """Store a track's measured loudness."""
+        if not video_id:
+            return
+        with self._lock:
+            self._remember(video_id, loudness)
+        self._executor.submit(self._write, video_id, loudness)
+
+    def _write(self, video_id, loudness):
+        """Store a measurement on disk. Runs in the SQLite thread."""
+        db = self._connect()
+        if not db:
+            return
+        try:
+            db.execute('INSERT OR REPLACE INTO loudness VALUES (?, ?, ?)', (video_id, loudness, time.time()))
+            db.commit()
+        except Exception as e:
+            logging.error(f"Error writing loudness cache: {e}")
+
+
+loudness_cache = LoudnessCache()
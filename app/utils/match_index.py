@@ -0,0 +1,218 @@
+import os
+import re
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+MATCH_INDEX_PATH = os.getenv('MATCH_INDEX_PATH', 'cache/matches.db')
+MATCH_INDEX_SIZE = int(os.getenv('MATCH_INDEX_SIZE', '16384'))
+
+# Candidates further than this from the Spotify duration are only used as a last resort
+MAX_DURATION_DIFF = 15
+# Words that mark a different recording unless the Spotify title has them too
+VERSION_WORDS = (
+    'live', 'cover', 'remix', 'karaoke', 'instrumental', 'acoustic', 'sped up',
+    'slowed', 'nightcore', 'reverb', '8d', 'edit', 'version', 'mashup', 'reaction'
+)
+VIDEO_WORDS = ('official video', 'music video', 'official mv', 'visualizer')
+
+
+def _words(text):
+    return ' '.join(re.findall(r'\w+', (text or '').casefold()))
+
+
+def track_keys(track):
+    """Get the index keys of a Spotify queue entry, most specific first."""
+    keys = []
+    if track.get('isrc'):
+        keys.append(f"isrc:{track['isrc'].upper()}")
+    if track.get('spotify_id'):
+        keys.append(f"spotify:{track['spotify_id']}")
+    if track.get('title'):
+        keys.append(f"q:{_words(track['title'])} {_words(track.get('artist'))}")
+    return keys
+
+
+def score_candidate(track, candidate):
+    """Score a flat search result as a match for a Spotify track, or None if it's unusable.
+
+    Duration is what matters most, an extra intro or outro shows up there;
+    titles only break ties between recordings of about the same length.
+    """
+    if not candidate.get('id'):
+        return None
+    title = _words(track.get('title'))
+    artist = _words(track.get('artist'))
+    candidate_title = _words(candidate.get('title'))
+    channel = _words(candidate.get('channel') or candidate.get('uploader'))
+
+    score = 0.0
+    expected, actual = track.get('duration') or 0, candidate.get('duration') or 0
+    if expected and actual:
+        difference = abs(expected - actual)
+        if difference > MAX_DURATION_DIFF:
+            score -= 100
+        score -= difference * 2
+    else:
+        score -= MAX_DURATION_DIFF
+
+    for word in VERSION_WORDS:
+        if re.search(rf'\b{word}\b', candidate_title) and not re.search(rf'\b{word}\b', title):
+            score -= 30
+    if any(phrase in candidate_title for phrase in VIDEO_WORDS):
+        score -= 5
+    # Auto-generated "Artist - Topic" uploads carry the album audio
+    if channel.endswith(' topic'):
+        score += 10
+    if artist and (artist in channel or artist in candidate_title):
+        score += 5
+    if title and title not in candidate_title:
+        score -= 10
+    return score
+
+
+def best_candidate(track, candidates):
+    """Pick the best scoring search result for a track, or None."""
+    scored = [(score_candidate(track, candidate), index, candidate) for index, candidate in enumerate(candidates)]
+    scored = [item for item in scored if item[0] is not None]
+    if not scored:
+        return None
+    # Search rank breaks ties
+    return max(scored, key=lambda item: (item[0], -item[1]))[2]
+
+
+class MatchIndex:
+    """Durable mapping of Spotify tracks (ISRC, track id, title) to chosen YouTube video ids.
+
+    Lookups hit a memory LRU first and SQLite after that, so a track matched
+    once, by any of its keys, is never searched for again. Disk reads and
+    writes run on a single SQLite thread, never on the event loop.
+    """
+    def __init__(self, path=MATCH_INDEX_PATH, max_memory=MATCH_INDEX_SIZE):
+        self.path = path
+        self.max_memory = max_memory
+        self._memory = OrderedDict()  # key -> video id
+        self._db = None
+        self._lock = threading.Lock()  # guards the memory LRU only
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='match-index')
+        self.hits = 0
+        self.misses = 0
+
+    def _connect(self):
+        """Open the on-disk index on first use."""
+        if self._db is not None:
+            return self._db
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS matches ('
+                'key TEXT PRIMARY KEY, video_id TEXT NOT NULL, score REAL, created REAL NOT NULL)'
+            )
+            db.commit()
+            self._db = db
+        except Exception as e:
+            logging.error(f"Failed to open match index at {self.path}: {e}")
+            self._db = False
+        return self._db
+
+    def _remember(self, key, video_id):
+        self._memory[key] = video_id
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory:
+            self._memory.popitem(last=False)
+
+    def _memory_get(self, keys):
+        with self._lock:
+            for key in keys:
+                video_id = self._memory.get(key)
+                if video_id:
+                    self._memory.move_to_end(key)
+                    return video_id
+        return None
+
+    def peek(self, track):
+        """Get the video id matched to a track if it is in memory, without touching disk."""
+        return self._memory_get(track_keys(track))
+
+    def _load(self, keys):
+        """Look the keys up on disk, most specific first. Runs in the SQLite thread."""
+        db = self._connect()
+        if not db:
+            return None
+        try:
+            rows = dict(db.execute(
+                f"SELECT key, video_id FROM matches WHERE key IN ({','.join('?' * len(keys))})", keys
+            ).fetchall())
+        except Exception as e:
+            logging.error(f"Error reading match index: {e}")
+            return None
+        return next((rows[key] for key in keys if key in rows), None)
+
+    async def get(self, track):
+        """Get the video id matched to a track, or None."""
+        keys = track_keys(track)
+        video_id = self._memory_get(keys)
+        if video_id is None and keys:
+            loop = asyncio.get_running_loop()
+            video_id = await loop.run_in_executor(self._executor, self._load, keys)
+            if video_id:
+                with self._lock:
+                    for key in keys:
+                        self._remember(key, video_id)
+
+        if video_id:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return video_id
+
+    def put(self, track, video_id, score=None):
+        """Remember the video chosen for a track under all of its keys."""
+        keys = track_keys(track)
+        if not keys or not video_id:
+            return
+        with self._lock:
+            for key in keys:
+                self._remember(key, video_id)
+        self._executor.submit(
+            self._write,
+            'INSERT OR REPLACE INTO matches VALUES (?, ?, ?, ?)',
+            [(key, video_id, score, time.time()) for key in keys]
+        )
+
+    def discard(self, track):
+        """Forget the video matched to a track."""
+        keys = track_keys(track)
+        if not keys:
+            return
+        with self._lock:
+            for key in keys:
+                self._memory.pop(key, None)
+        self._executor.submit(self._write, 'DELETE FROM matches WHERE key = ?', [(key,) for key in keys])
+
+    def _write(self, statement, rows):
+        """Apply a change on disk. Runs in the SQLite thread."""
+        db = self._connect()
+        if not db:
+            return
+        try:
+            db.executemany(statement, rows)
+            db.commit()
+        except Exception as e:
+            logging.error(f"Error writing match index: {e}")
+
+    def stats(self):
+        """Get index counters."""
+        return {'hits': self.hits, 'misses': self.misses, 'memory_entries': len(self._memory)}
+
+
+match_index = MatchIndex()
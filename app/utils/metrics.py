@@ -0,0 +1,197 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+# Port of the Prometheus endpoint, 0 disables it
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+LOOP_LAG_INTERVAL = 0.5
+PREFIX = 'tunebot_'
+
+# Upper bounds in seconds, shared by every histogram
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Histogram:
+    """Bucketed distribution of observations for one label set."""
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Estimate a quantile as the upper bound of the bucket it falls in."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+class Metrics:
+    """Process-wide counters and histograms, keyed by name and labels.
+
+    Safe to record from the voice threads as well as the event loop.
+    """
+    def __init__(self):
+        self._counters = {}    # name -> {labels: value}
+        self._histograms = {}  # name -> {labels: Histogram}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _labels(labels):
+        return tuple(sorted((key, str(value)) for key, value in labels.items() if value is not None))
+
+    def describe(self, name, text):
+        """Set the help text of a metric."""
+        self._help[name] = text
+
+    def inc(self, name, value=1, **labels):
+        """Increase a counter."""
+        key = self._labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """Record a value in a histogram."""
+        key = self._labels(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Time a block, awaits included, into a histogram."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def snapshot(self, name):
+        """Merge a histogram over every label set into (count, avg, p95)."""
+        with self._lock:
+            series = list(self._histograms.get(name, {}).values())
+        if not series:
+            return None
+        merged = Histogram(series[0].buckets)
+        for histogram in series:
+            merged.count += histogram.count
+            merged.sum += histogram.sum
+            merged.counts = [a + b for a, b in zip(merged.counts, histogram.counts)]
+        return merged.count, merged.sum / merged.count, merged.quantile(0.95)
+
+    def total(self, name):
+        """Sum a counter over every label set."""
+        with self._lock:
+            return sum(self._counters.get(name, {}).values())
+
+    def render(self, gauges=None):
+        """Render everything in the Prometheus text format."""
+        lines = []
+
+        def label_text(labels, extra=()):
+            pairs = [f'{key}="{value}"' for key, value in (*labels, *extra)]
+            return '{' + ','.join(pairs) + '}' if pairs else ''
+
+        def header(name, kind):
+            if name in self._help:
+                lines.append(f"# HELP {PREFIX}{name} {self._help[name]}")
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                header(name, 'counter')
+                for labels, value in series.items():
+                    lines.append(f"{PREFIX}{name}{label_text(labels)} {value}")
+
+            for name, series in sorted(self._histograms.items()):
+                header(name, 'histogram')
+                name = PREFIX + name
+                for labels, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{label_text(labels, [('le', bound)])} {cumulative}")
+                    lines.append(f"{name}_bucket{label_text(labels, [('le', '+Inf')])} {histogram.count}")
+                    lines.append(f"{name}_sum{label_text(labels)} {histogram.sum}")
+                    lines.append(f"{name}_count{label_text(labels)} {histogram.count}")
+
+        for name, value in sorted((gauges or {}).items()):
+            if isinstance(value, (int, float)):
+                lines.append(f"# TYPE {PREFIX}{name} gauge")
+                lines.append(f"{PREFIX}{name} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+async def monitor_loop_lag(interval=LOOP_LAG_INTERVAL):
+    """Record how late the event loop wakes up from a sleep."""
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        metrics.observe('event_loop_lag_seconds', max(0.0, time.perf_counter() - started - interval))
+
+
+async def start_metrics_server(get_gauges, pages=None, host=METRICS_HOST, port=METRICS_PORT):
+    """Serve /metrics, plus any extra plain text pages, over HTTP.
+
+    Returns the runner, or None when disabled.
+    """
+    if not port:
+        return None
+    from aiohttp import web
+
+    async def handle(request):
+        return web.Response(text=metrics.render(get_gauges()), content_type='text/plain')
+
+    def page(render):
+        async def handle_page(request):
+            return web.Response(text=render(), content_type='text/plain')
+        return handle_page
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle)
+    for path, render in (pages or {}).items():
+        app.router.add_get(path, page(render))
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        logging.error(f"Failed to start metrics endpoint on {host}:{port}: {e}")
+        await runner.cleanup()
+        return None
+    return runner
+
+
+metrics = Metrics()
+metrics.describe('event_loop_lag_seconds', 'Delay of the event loop waking up from a sleep')
+metrics.describe('voice_frame_jitter_seconds', 'Deviation of voice frame reads from the 20 ms schedule')
+metrics.describe('extraction_seconds', 'yt-dlp extraction time')
+metrics.describe('track_resolve_seconds', 'Time to resolve a queue entry into a playable source')
+metrics.describe('spotify_request_seconds', 'Spotify API call time')
+metrics.describe('sponsorblock_request_seconds', 'SponsorBlock API call time')
+metrics.describe('ffmpeg_spawn_seconds', 'Time to start an FFmpeg process')
+metrics.describe('embed_edit_seconds', 'Now playing embed edit time')
+metrics.describe('track_transition_gap_seconds', 'Silence between two consecutive tracks')
+metrics.describe('startup_seconds', 'Time from process start to the first ready event')
+metrics.describe('event_loop_stall_seconds', 'Duration of event loop stalls over the watchdog threshold')
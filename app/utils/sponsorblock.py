@@ -1,12 +1,81 @@
-import sponsorblock as sb
+import os
+import json
+import time
+import asyncio
+import hashlib
 import logging
+import aiohttp
+from bisect import bisect_right
+from collections import OrderedDict
 from urllib.parse import urlparse, parse_qs
+from utils.metrics import metrics
+
+SPONSORBLOCK_API = os.getenv('SPONSORBLOCK_API', 'https://sponsor.ajay.app')
+SEGMENT_CACHE_SIZE = int(os.getenv('SEGMENT_CACHE_SIZE', '4096'))
+SEGMENT_CACHE_TTL = int(os.getenv('SEGMENT_CACHE_TTL', '21600'))
+# Playback never waits longer than this for segments; the lookup finishes in the background
+SEGMENT_BUDGET_MS = int(os.getenv('SPONSORBLOCK_BUDGET_MS', '400'))
+SEGMENT_CONCURRENCY = 4
+# Shortest prefix the API accepts; every video sharing it comes back in one response
+HASH_PREFIX_LENGTH = 4
+REQUEST_TIMEOUT = 5
+
+# Segments closer together than this are skipped as one
+MERGE_GAP_SECONDS = 1.0
+
+
+class SegmentIndex:
+    """Sorted, merged skip intervals with binary search lookups."""
+    def __init__(self, segments=()):
+        intervals = sorted(
+            (float(start), float(end)) for start, end in segments if end > start
+        )
+        merged = []
+        for start, end in intervals:
+            if merged and start <= merged[-1][1] + MERGE_GAP_SECONDS:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        self.starts = [start for start, _ in merged]
+        self.ends = [end for _, end in merged]
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __bool__(self):
+        return bool(self.starts)
+
+    def __iter__(self):
+        return iter(zip(self.starts, self.ends))
+
+    def find(self, position):
+        """Get the (start, end) interval containing a position, if any."""
+        i = bisect_right(self.starts, position) - 1
+        if i >= 0 and position < self.ends[i]:
+            return self.starts[i], self.ends[i]
+        return None
+
+    def next_start(self, position):
+        """Get where the next interval at or after a position begins."""
+        segment = self.find(position)
+        if segment:
+            return segment[0]
+        i = bisect_right(self.starts, position)
+        return self.starts[i] if i < len(self.starts) else None
+
+    def skipped_after(self, position):
+        """Get how many seconds will be skipped after a position."""
+        return sum(max(0.0, end - max(start, position)) for start, end in self)
 
-logging.basicConfig(level=logging.ERROR)
 
 class SponsorBlockHandler:
-    def __init__(self):
-        self.client = sb.Client()
+    """Process-wide SponsorBlock client.
+
+    Lookups go through the hash-prefix API over one pooled aiohttp session.
+    Results, including videos without segments, are kept in an LRU cache with
+    a TTL, and concurrent lookups of the same prefix share one request.
+    """
+    def __init__(self, cache_size=SEGMENT_CACHE_SIZE, ttl=SEGMENT_CACHE_TTL):
         # Categories to skip
         self.categories = [
             "sponsor",
@@ -18,6 +87,16 @@ class SponsorBlockHandler:
             "filler",      # Filler content
             "music_offtopic"  # Non-music parts
         ]
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self._cache = OrderedDict()  # video id -> (expires, SegmentIndex)
+        self._pending = {}           # hash prefix -> task
+        self._session = None
+        self._semaphore = None
+        self.hits = 0
+        self.misses = 0
+        self.requests = 0
+        self.timeouts = 0
 
     def extract_video_id(self, url):
         """Extract video ID from YouTube URL."""
@@ -25,7 +104,7 @@ class SponsorBlockHandler:
             parsed = urlparse(url)
             if parsed.hostname == 'youtu.be':
                 return parsed.path[1:]
-            if parsed.hostname in ('www.youtube.com', 'youtube.com'):
+            if parsed.hostname in ('www.youtube.com', 'youtube.com', 'm.youtube.com', 'music.youtube.com'):
                 if parsed.path == '/watch':
                     return parse_qs(parsed.query)['v'][0]
                 if parsed.path[:7] == '/embed/':
@@ -36,30 +115,140 @@ class SponsorBlockHandler:
             logging.error(f"Error extracting video ID: {e}")
         return None
 
-    async def get_skip_segments(self, url):
-        """Get segments to skip for a video."""
-        try:
-            video_id = self.extract_video_id(url)
-            if not video_id:
-                return []
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=SEGMENT_CONCURRENCY),
+                timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+            )
+            self._semaphore = asyncio.Semaphore(SEGMENT_CONCURRENCY)
+        return self._session
+
+    def _cached(self, video_id):
+        """Get a cached index, or None if missing or expired."""
+        item = self._cache.get(video_id)
+        if item is None:
+            return None
+        if item[0] < time.monotonic():
+            del self._cache[video_id]
+            return None
+        self._cache.move_to_end(video_id)
+        return item[1]
+
+    def _store(self, video_id, index):
+        self._cache[video_id] = (time.monotonic() + self.ttl, index)
+        self._cache.move_to_end(video_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
 
-            segments = await self.client.get_skip_segments(
-                video_id, 
-                categories=self.categories
+    @staticmethod
+    def hash_prefix(video_id):
+        return hashlib.sha256(video_id.encode()).hexdigest()[:HASH_PREFIX_LENGTH]
+
+    async def _fetch_prefix(self, prefix, video_ids):
+        """Look up every video under a hash prefix and cache the ones we asked for."""
+        session = self._get_session()
+        params = {
+            'categories': json.dumps(self.categories),
+            'actionType': 'skip'
+        }
+        async with self._semaphore:
+            self.requests += 1
+            with metrics.timer('sponsorblock_request_seconds'):
+                async with session.get(f"{SPONSORBLOCK_API}/api/skipSegments/{prefix}", params=params) as response:
+                    if response.status == 404:
+                        results = []
+                    else:
+                        response.raise_for_status()
+                        results = await response.json()
+
+        found = {
+            result.get('videoID'): SegmentIndex(
+                tuple(segment['segment']) for segment in result.get('segments', [])
             )
-            
-            # Sort segments by start time
-            segments = sorted(segments, key=lambda x: x.start_time)
-            
-            return segments
+            for result in results
+        }
+        # Only cache what we asked for, the rest of the prefix is unrelated videos
+        for video_id in video_ids:
+            self._store(video_id, found.get(video_id) or SegmentIndex())
 
-        except Exception as e:
-            logging.error(f"Error getting skip segments: {e}")
-            return []
-
-    def get_current_segment(self, segments, current_time):
-        """Get current segment if we're in one."""
-        for segment in segments:
-            if segment.start_time <= current_time < segment.end_time:
-                return segment
-        return None 
\ No newline at end of file
+    def _lookup(self, video_ids):
+        """Start lookups for uncached ids, one request per hash prefix."""
+        by_prefix = {}
+        for video_id in video_ids:
+            if self._cached(video_id) is None:
+                by_prefix.setdefault(self.hash_prefix(video_id), set()).add(video_id)
+
+        tasks = []
+        for prefix, ids in by_prefix.items():
+            task = self._pending.get(prefix)
+            if task is None or not ids <= task.video_ids:
+                if task is not None:
+                    ids |= task.video_ids
+                task = asyncio.create_task(self._fetch_prefix(prefix, ids))
+                task.video_ids = ids
+                task.add_done_callback(lambda t, prefix=prefix: self._finished(prefix, t))
+                self._pending[prefix] = task
+            tasks.append(task)
+        return tasks
+
+    def _finished(self, prefix, task):
+        if self._pending.get(prefix) is task:
+            del self._pending[prefix]
+        if not task.cancelled() and task.exception():
+            logging.error(f"Error getting skip segments: {task.exception()}")
+
+    def prefetch(self, video_ids):
+        """Fetch segments for upcoming videos in the background."""
+        self._lookup([video_id for video_id in video_ids if video_id])
+
+    async def get_skip_segments(self, url, budget_ms=SEGMENT_BUDGET_MS):
+        """Get an index of the segments to skip for a video."""
+        video_id = self.extract_video_id(url)
+        if not video_id:
+            return SegmentIndex()
+        return await self.get_segment_index(video_id, budget_ms)
+
+    async def get_segment_index(self, video_id, budget_ms=SEGMENT_BUDGET_MS):
+        """Get an index of the segments to skip for a video ID.
+
+        Gives up with no segments after the latency budget; the request keeps
+        running so the result is cached for the next play.
+        """
+        index = self._cached(video_id)
+        if index is not None:
+            self.hits += 1
+            return index
+
+        self.misses += 1
+        tasks = self._lookup([video_id])
+        try:
+            await asyncio.wait_for(asyncio.shield(tasks[0]), budget_ms / 1000)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            metrics.inc('sponsorblock_timeouts_total')
+            return SegmentIndex()
+        except Exception:
+            # Already logged when the lookup finished
+            return SegmentIndex()
+        return self._cached(video_id) or SegmentIndex()
+
+    def stats(self):
+        """Get cache and request counters."""
+        return {
+            'cached': len(self._cache),
+            'hits': self.hits,
+            'misses': self.misses,
+            'requests': self.requests,
+            'timeouts': self.timeouts
+        }
+
+    async def close(self):
+        """Close the HTTP session."""
+        for task in list(self._pending.values()):
+            task.cancel()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+
+sponsorblock_handler = SponsorBlockHandler()
@@ -0,0 +1,122 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from utils.metrics import metrics
+
+logger = logging.getLogger('StallWatchdog')
+
+# A loop that hasn't run a callback for this long counts as stalled
+STALL_THRESHOLD_MS = int(os.getenv('STALL_THRESHOLD_MS', '250'))
+HEARTBEAT_SECONDS = 0.05
+# Frames kept per captured stack
+STACK_DEPTH = 12
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class StallWatchdog:
+    """Detects event loop stalls from a separate thread and records what blocked.
+
+    A task on the loop bumps a heartbeat; when the heartbeat is older than the
+    threshold the watchdog samples the loop thread's stack. Stalls are grouped
+    by the innermost bot frame on that stack so repeat offenders add up.
+    """
+    def __init__(self, loop, threshold_ms=STALL_THRESHOLD_MS):
+        self.loop = loop
+        self.threshold = threshold_ms / 1000
+        self.offenders = {}  # location -> {'count', 'total', 'max', 'stack'}
+        self.stalls = 0
+        self._beat = time.monotonic()
+        self._loop_thread = None
+        self._stalled = None  # (started, location) of the stall in progress
+        self._running = False
+        self._task = None
+        self._thread = None
+
+    def start(self):
+        """Start the heartbeat task and the watchdog thread. Call from the loop."""
+        if self._running:
+            return
+        self._running = True
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._task = self.loop.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name='stall-watchdog', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._task:
+            self._task.cancel()
+
+    async def _heartbeat(self):
+        while self._running:
+            self._beat = time.monotonic()
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+
+    def _watch(self):
+        while self._running:
+            time.sleep(HEARTBEAT_SECONDS / 2)
+            beat = self._beat
+            stalled_for = time.monotonic() - beat
+
+            if stalled_for >= self.threshold:
+                if self._stalled is None or self._stalled[0] != beat:
+                    self._stalled = (beat, self._capture())
+            elif self._stalled is not None:
+                started, location = self._stalled
+                self._stalled = None
+                # The heartbeat resumed, the stall lasted until it did
+                self._record(location, self._beat - started - HEARTBEAT_SECONDS)
+
+    def _capture(self):
+        """Sample the loop thread's stack and file it under its innermost bot frame."""
+        frame = sys._current_frames().get(self._loop_thread)
+        if frame is None:
+            return None
+        stack = traceback.extract_stack(frame)[-STACK_DEPTH:]
+        own = [entry for entry in stack if entry.filename.startswith(APP_DIR)]
+        culprit = (own or stack)[-1]
+        location = f"{os.path.relpath(culprit.filename, APP_DIR)}:{culprit.lineno} in {culprit.name}"
+
+        offender = self.offenders.get(location)
+        if offender is None:
+            self.offenders[location] = {
+                'count': 0, 'total': 0.0, 'max': 0.0,
+                'stack': ''.join(traceback.format_list(stack))
+            }
+            logger.warning(f"Event loop blocked at {location}:\n{self.offenders[location]['stack']}")
+        return location
+
+    def _record(self, location, duration):
+        duration = max(duration, self.threshold)
+        self.stalls += 1
+        metrics.inc('event_loop_stalls_total')
+        metrics.observe('event_loop_stall_seconds', duration)
+        offender = self.offenders.get(location)
+        if offender:
+            offender['count'] += 1
+            offender['total'] += duration
+            offender['max'] = max(offender['max'], duration)
+
+    def top(self, limit=10):
+        """Get the worst offenders as (location, offender) by total stalled time."""
+        return sorted(self.offenders.items(), key=lambda item: item[1]['total'], reverse=True)[:limit]
+
+    def report(self, limit=10, stacks=True):
+        """Render the offenders as plain text."""
+        if not self.offenders:
+            return f"No event loop stalls over {self.threshold * 1000:.0f} ms\n"
+        lines = [f"{self.stalls} event loop stalls over {self.threshold * 1000:.0f} ms"]
+        for location, offender in self.top(limit):
+            lines.append(
+                f"\n{location}: {offender['count']} stalls, "
+                f"{offender['total'] * 1000:.0f} ms total, {offender['max'] * 1000:.0f} ms max"
+            )
+            if stacks:
+                lines.append(offender['stack'])
+        return '\n'.join(lines) + '\n'
@@ -1,21 +1,19 @@
 import discord
 import asyncio
-import time
 import logging
 import math
 from datetime import datetime
 from utils.format import format_duration
 
-logging.basicConfig(level=logging.ERROR)
-
 class NowPlayingView:
-    def __init__(self, ctx, bot, track_info):
+    def __init__(self, ctx, bot, track_info, player):
         self.ctx = ctx
         self.bot = bot
+        self.player = player
         self.track_info = track_info
         self.message = None
         self.is_updating = True
-        self.start_time = time.time()
+        self.last_signature = None
         
         # Progress bar settings
         self.bar_length = 24
@@ -24,7 +22,7 @@ class NowPlayingView:
         self.slider_chars = ["⬤", "◉", "○", "◉"]
         self.slider_index = 0
         
-        # Update intervals (in seconds)
+        # Update intervals (in seconds), picked by the refresh scheduler based on load
         self.update_intervals = [4, 6, 8]
         
         # Visualizer frames (fixed characters)
@@ -48,8 +46,8 @@ class NowPlayingView:
         self.current_position = 0
 
         # Store previous view to cleanup
-        self.previous_view = getattr(bot, 'current_np_view', None)
-        bot.current_np_view = self
+        self.previous_view = player.np_view
+        player.np_view = self
 
     def create_progress_bar(self, position, duration):
         """Create an animated progress bar."""
@@ -219,23 +217,15 @@ class NowPlayingView:
     async def update_position(self):
         """Update the current position."""
         try:
-            if not self.ctx.voice_client or not self.ctx.voice_client.is_playing():
+            if not self.ctx.voice_client:
                 return False
-
-            source = self.ctx.voice_client.source
-            if not source:
+            if self.ctx.voice_client.is_paused():
+                return True
+            if not self.ctx.voice_client.is_playing():
                 return False
 
-            # Calculate elapsed time
-            if hasattr(source, 'start_time'):
-                elapsed = time.time() - source.start_time
-                self.current_position = int(elapsed)
-            elif hasattr(source, '_player') and hasattr(source._player, 'time'):
-                self.current_position = int(source._player.time / 1000)  # Convert ms to seconds
-            else:
-                # Fallback to manual tracking
-                elapsed = time.time() - self.start_time
-                self.current_position = int(elapsed)
+            # Counted from the frames sent, so pauses and seeks are accounted for
+            self.current_position = int(self.player.get_position())
 
             # Ensure position doesn't exceed duration
             duration = self.track_info.get('duration', 0)
@@ -260,9 +250,8 @@ class NowPlayingView:
                     except discord.NotFound:
                         pass
 
-            # Initialize position and start time
-            self.current_position = 0
-            self.start_time = time.time()
+            # Initialize position
+            self.current_position = int(self.player.get_position())
             
             # Create and send initial embed
             initial_embed = self.get_embed()
@@ -270,40 +259,69 @@ class NowPlayingView:
                 raise ValueError("Failed to create initial embed")
 
             self.message = await self.ctx.send(embed=initial_embed)
-            
-            # Update loop
-            while self.is_updating:
-                try:
-                    if not await self.update_position():
-                        break
-
-                    embed = self.get_embed()
-                    if embed:
-                        await self.message.edit(embed=embed)
-                    
-                    # Update every second
-                    await asyncio.sleep(1)
+            self.last_signature = self.get_signature()
 
-                except discord.NotFound:
-                    break  # Message was deleted
-                except discord.HTTPException:
-                    await asyncio.sleep(4)  # Rate limit
-                except Exception as e:
-                    logging.error(f"Error updating now playing view: {e}")
-                    break
+            # Further updates are paced by the shared refresh scheduler
+            if self.is_updating:
+                self.bot.refresh_scheduler.register(self)
+            else:
+                # Replaced while the message was being sent
+                await self.message.delete()
 
         except Exception as e:
             logging.error(f"Failed to start now playing view: {e}")
             await self.ctx.send("❌ Failed to display now playing view")
             self.stop()
 
+    def get_signature(self):
+        """Get the state shown by the embed, ignoring the animations."""
+        duration = self.track_info.get('duration', 0)
+        next_track = self.get_next_track_info()
+        queue = self.bot.music_queues.get(self.ctx.guild.id)
+        return (
+            self.track_info.get('title'),
+            self.current_position,
+            math.floor(self.bar_length * self.current_position / duration) if duration > 0 else 0,
+            len(queue.queue) if queue else 0,
+            next_track['title'] if next_track else None
+        )
+
+    async def refresh(self):
+        """Edit the message if what it shows has changed.
+
+        Returns True if an edit was sent. Called by the refresh scheduler.
+        """
+        if not self.is_updating or not self.message:
+            return False
+
+        if not await self.update_position():
+            self.stop_updating()
+            return False
+
+        signature = self.get_signature()
+        if signature == self.last_signature:
+            return False
+
+        embed = self.get_embed()
+        if not embed:
+            return False
+
+        await self.message.edit(embed=embed)
+        self.last_signature = signature
+        return True
+
+    def stop_updating(self):
+        """Stop refreshing but keep the message."""
+        self.is_updating = False
+        self.bot.refresh_scheduler.unregister(self)
+
     def stop(self):
         """Stop updating the Now Playing view."""
-        self.is_updating = False
+        self.stop_updating()
         if hasattr(self, 'message') and self.message:
             try:
                 asyncio.create_task(self.message.delete())
             except:
                 pass
-        if hasattr(self.bot, 'current_np_view') and self.bot.current_np_view == self:
-            self.bot.current_np_view = None
\ No newline at end of file
+        if self.player.np_view is self:
+            self.player.np_view = None
\ No newline at end of file
@@ -134,7 +134,7 @@ class QueueView(discord.ui.View):
             
         start = self.page * self.items_per_page
         end = start + self.items_per_page
-        return list(queue.queue)[start:end]
+        return queue.queue[start:end]
 
     def get_embed(self):
         """Create queue embed."""
@@ -204,7 +204,7 @@ class QueueView(discord.ui.View):
         queue = self.bot.music_queues[self.ctx.guild.id]
         status = [
             f"• Total Tracks: {total_queue}",
-            f"• 🔁 Loop: {'Enabled' if queue.loop else 'Disabled'}",
+            f"• 🔁 Loop: {queue.loop.name.capitalize()}",
             f"• 🔊 Volume: {int(queue.volume * 100)}%",
             f"• 🎲 Shuffled: {queue.shuffle_count} times",
             f"• ⏱️ Total Duration: {self.get_total_duration()}"
@@ -212,20 +212,16 @@ class QueueView(discord.ui.View):
         embed.add_field(name="📊 Queue Status", value="\n".join(status), inline=False)
 
         # Add contributors section
-        contributors = {}
-        for item in queue.queue:
-            requester = item.get('requester', None) if isinstance(item, dict) else getattr(item, 'requester', None)
-            if hasattr(requester, 'mention'):
-                if requester.mention not in contributors:
-                    contributors[requester.mention] = {'tracks': 0, 'duration': 0}
-                contributors[requester.mention]['tracks'] += 1
-                duration = item.get('duration', 0) if isinstance(item, dict) else getattr(item, 'duration', 0)
-                contributors[requester.mention]['duration'] += duration
+        contributors = [
+            (requester.mention, tracks, duration)
+            for requester, tracks, duration in queue.requester_stats()
+            if hasattr(requester, 'mention')
+        ]
 
         if contributors:
             contributor_text = "\n".join(
-                f"• 👤 {mention} | 🎵 {stats['tracks']} tracks | ⏱️ {format_duration(stats['duration'])}"
-                for mention, stats in contributors.items()
+                f"• 👤 {mention} | 🎵 {tracks} tracks | ⏱️ {format_duration(duration)}"
+                for mention, tracks, duration in contributors
             )
             embed.add_field(name="👥 Contributors", value=contributor_text, inline=False)
         
@@ -240,14 +236,7 @@ class QueueView(discord.ui.View):
         if not queue or not queue.queue:
             return "0:00"
             
-        total_seconds = 0
-        for item in queue.queue:
-            if isinstance(item, dict):
-                total_seconds += item.get('duration', 0)
-            else:
-                total_seconds += getattr(item, 'duration', 0)
-                
-        return format_duration(total_seconds)
+        return format_duration(queue.total_duration)
 
     async def show(self):
         """Display the queue."""
@@ -0,0 +1,173 @@
+import os
+import time
+import asyncio
+import logging
+import discord
+from utils.metrics import metrics
+
+# Budget for cosmetic embed edits across every guild on this process
+EMBED_EDITS_PER_SECOND = float(os.getenv('EMBED_EDITS_PER_SECOND', '2'))
+MIN_EDITS_PER_SECOND = 0.2
+# Hold a guild's cosmetic edits this long after a command there so its replies go out first
+COMMAND_QUIET_SECONDS = 2
+# An edit slower than this was most likely queued behind a rate limit
+SLOW_EDIT_SECONDS = 1.0
+TICK_SECONDS = 0.5
+
+
+class RefreshScheduler:
+    """Central scheduler for now playing embed refreshes.
+
+    Views register once instead of running their own edit loops. Edits are
+    spread over a shared budget, each view's interval stretches with the
+    number of active views, and a guild's view waits out a command run in
+    that guild. Due edits run concurrently, so a slow one only holds its own
+    view.
+
+    discord.py only exposes Discord's rate limit headers when an edit fails,
+    so the budget follows X-RateLimit-Remaining / X-RateLimit-Reset-After
+    from those responses. Between failures it is an estimate, halved on a
+    429 or an edit slow enough to have waited on a bucket and slowly regrown.
+    """
+    def __init__(self, bot, edits_per_second=EMBED_EDITS_PER_SECOND):
+        self.bot = bot
+        self.max_rate = edits_per_second
+        self.rate = edits_per_second
+        self.views = {}
+        self._tokens = edits_per_second
+        self._last_refill = time.monotonic()
+        self._backoff_until = 0
+        self._last_command = {}  # guild id -> time of its latest command
+        self._task = None
+        self._in_flight = {}  # view -> its edit task
+        self.edits = 0
+        self.skipped = 0
+
+    def register(self, view):
+        """Start refreshing a view."""
+        self.views[view] = time.monotonic() + self.interval_for(view)
+        if self._task is None or self._task.done():
+            self._task = self.bot.loop.create_task(self._run())
+
+    def unregister(self, view):
+        """Stop refreshing a view."""
+        self.views.pop(view, None)
+
+    def command_activity(self, guild_id):
+        """Called when a command runs so its replies take priority over that guild's edits."""
+        self._last_command[guild_id] = time.monotonic()
+
+    def _quiet_guilds(self, now):
+        """Get the guilds that ran a command within the quiet window, dropping older entries."""
+        self._last_command = {
+            guild_id: at for guild_id, at in self._last_command.items()
+            if now - at < COMMAND_QUIET_SECONDS
+        }
+        return self._last_command
+
+    def interval_for(self, view):
+        """Get how often a view may be edited given the current load."""
+        intervals = view.update_intervals
+        count = len(self.views)
+        if count <= 5:
+            interval = intervals[0]
+        elif count <= 20:
+            interval = intervals[1]
+        else:
+            interval = intervals[-1]
+        # Never schedule more edits than the budget allows
+        return max(interval, count / self.rate)
+
+    def _backoff(self, seconds):
+        """Slow down after Discord pushed back."""
+        self.rate = max(MIN_EDITS_PER_SECOND, self.rate / 2)
+        self._backoff_until = time.monotonic() + seconds
+
+    def _follow_headers(self, response):
+        """Fit the budget to the rate limit Discord reported on a response."""
+        headers = getattr(response, 'headers', None) or {}
+        try:
+            remaining = int(headers['X-RateLimit-Remaining'])
+            reset_after = float(headers['X-RateLimit-Reset-After'])
+        except (KeyError, ValueError):
+            return False
+        if remaining == 0:
+            self._backoff(reset_after)
+        elif reset_after > 0:
+            self.rate = max(MIN_EDITS_PER_SECOND, min(self.max_rate, remaining / reset_after))
+            self._tokens = min(self._tokens, self.rate)
+        return True
+
+    def _refill(self, now):
+        self._tokens = min(self.rate, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+        # Recover the budget gradually while edits go through
+        self.rate = min(self.max_rate, self.rate + 0.01)
+
+    async def _refresh(self, view):
+        started = time.monotonic()
+        guild = view.ctx.guild.id
+        try:
+            edited = await view.refresh()
+        except discord.NotFound:
+            view.stop()
+            return
+        except discord.RateLimited as e:
+            metrics.inc('embed_edit_errors_total', guild=guild, status=429)
+            self._backoff(e.retry_after)
+            return
+        except discord.HTTPException as e:
+            metrics.inc('embed_edit_errors_total', guild=guild, status=e.status)
+            if self._follow_headers(e.response):
+                return
+            if e.status == 429:
+                self._backoff(getattr(e, 'retry_after', 5) or 5)
+            else:
+                self._backoff(1)
+            return
+        except Exception as e:
+            logging.error(f"Error refreshing now playing view: {e}")
+            view.stop()
+            return
+
+        if edited:
+            self.edits += 1
+            elapsed = time.monotonic() - started
+            metrics.observe('embed_edit_seconds', elapsed, guild=guild)
+            if elapsed > SLOW_EDIT_SECONDS:
+                self._backoff(0)
+        else:
+            self.skipped += 1
+            # Nothing was sent, give back the token reserved for it
+            self._tokens = min(self.rate, self._tokens + 1)
+
+    async def _run(self):
+        while self.views:
+            await asyncio.sleep(TICK_SECONDS)
+            now = time.monotonic()
+            if now < self._backoff_until:
+                continue
+
+            self._refill(now)
+            quiet = self._quiet_guilds(now)
+            due = sorted((due, id(view), view) for view, due in self.views.items() if due <= now)
+            for _, _, view in due:
+                if self._tokens < 1:
+                    break
+                # Stays due, so it is edited as soon as its guild's window passes
+                if view not in self.views or view in self._in_flight or view.ctx.guild.id in quiet:
+                    continue
+                self.views[view] = now + self.interval_for(view)
+                self._tokens -= 1
+                task = self.bot.loop.create_task(self._refresh(view))
+                self._in_flight[view] = task
+                task.add_done_callback(lambda _, view=view: self._in_flight.pop(view, None))
+
+    def close(self):
+        """Stop refreshing every view."""
+        self.views.clear()
+        for task in list(self._in_flight.values()):
+            task.cancel()
+        if self._task:
+            self._task.cancel()
+            self._task = None